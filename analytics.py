@@ -0,0 +1,194 @@
+"""Incrementally maintained motion event statistics"""
+import datetime
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Hourly slots kept for the rolling totals (7 days)
+WINDOW_HOURS = 7 * 24
+
+# Event ids remembered so re-fetched events are not counted twice
+MAX_SEEN_EVENTS = 20000
+
+SAVE_INTERVAL = 60
+
+
+def parse_timestamp(value):
+    """Parse a Blink created_at timestamp into epoch seconds, or None"""
+    try:
+        parsed = datetime.datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    return parsed.timestamp()
+
+
+def _event_key(event):
+    """Dedup key: the event id, or camera and time for events without one"""
+    if event.get('id') is not None:
+        return f"id:{event['id']}"
+    return f"at:{event.get('camera', 'Unknown')}|{event.get('timestamp')}"
+
+
+class ActivityStats:
+    """Per-camera event counts by hour of day, day of week and rolling window.
+
+    Every structure is a fixed-size numpy array per camera, so ingesting an
+    event and answering a query cost the same regardless of history length.
+    With a `path`, the arrays and seen event keys are saved there as .npz
+    and loaded on first use, so totals survive restarts. numpy is imported
+    on first use too, keeping it out of app startup.
+    """
+
+    def __init__(self, path=None, log=print):
+        self.path = path
+        self.log = log
+        self._cameras = {}
+        self._by_hour = self._by_weekday = self._totals = self._recent = None
+        self._head_hour = int(time.time() // 3600)
+        self._seen = OrderedDict()
+        self._loaded = False
+        self._dirty = False
+        self._last_save = 0
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Load saved statistics; called at warm-up or on first use"""
+        with self._lock:
+            self._load_locked()
+
+    def _load_locked(self):
+        if self._loaded:
+            return
+        import numpy as np
+        self._loaded = True
+        self._by_hour = np.zeros((0, 24), dtype=np.int64)
+        self._by_weekday = np.zeros((0, 7), dtype=np.int64)
+        self._totals = np.zeros(0, dtype=np.int64)
+        self._recent = np.zeros((0, WINDOW_HOURS), dtype=np.int64)
+        if self.path is None or not os.path.exists(self.path):
+            return
+        try:
+            with np.load(self.path) as saved:
+                self._cameras = {str(name): row for row, name in enumerate(saved['cameras'])}
+                self._by_hour = saved['by_hour']
+                self._by_weekday = saved['by_weekday']
+                self._totals = saved['totals']
+                self._recent = saved['recent']
+                head_hour = int(saved['head_hour'])
+                self._seen = OrderedDict((str(key), True) for key in saved['seen'])
+        except (OSError, KeyError, ValueError) as e:
+            self.log(f'Activity stats unreadable, starting empty: {e}')
+            return
+        # Slots between the saved head and now are cleared by the next advance
+        self._head_hour = head_hour
+
+    def save(self):
+        with self._lock:
+            self._save_locked()
+
+    def _save_locked(self):
+        if self.path is None or not self._dirty:
+            return
+        import numpy as np
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(
+                f,
+                cameras=np.array(list(self._cameras), dtype=str),
+                by_hour=self._by_hour,
+                by_weekday=self._by_weekday,
+                totals=self._totals,
+                recent=self._recent,
+                head_hour=np.array(self._head_hour),
+                seen=np.array(list(self._seen), dtype=str),
+            )
+        os.replace(tmp_path, self.path)
+        self._dirty = False
+        self._last_save = time.time()
+
+    def _camera_row(self, camera):
+        row = self._cameras.get(camera)
+        if row is None:
+            import numpy as np
+            row = len(self._cameras)
+            self._cameras[camera] = row
+            self._by_hour = np.vstack((self._by_hour, np.zeros((1, 24), dtype=np.int64)))
+            self._by_weekday = np.vstack((self._by_weekday, np.zeros((1, 7), dtype=np.int64)))
+            self._totals = np.append(self._totals, 0)
+            self._recent = np.vstack((self._recent, np.zeros((1, WINDOW_HOURS), dtype=np.int64)))
+        return row
+
+    def _advance(self, hour):
+        """Move the rolling window forward to `hour`, clearing expired slots"""
+        if hour <= self._head_hour:
+            return
+        import numpy as np
+        steps = min(hour - self._head_hour, WINDOW_HOURS)
+        expired = np.arange(hour - steps + 1, hour + 1) % WINDOW_HOURS
+        self._recent[:, expired] = 0
+        self._head_hour = hour
+
+    def ingest(self, events):
+        """Count new events; each needs 'camera' and 'timestamp', and usually 'id'.
+
+        Returns the number of events that had not been seen before.
+        """
+        added = 0
+        with self._lock:
+            self._load_locked()
+            self._advance(int(time.time() // 3600))
+            for event in events:
+                key = _event_key(event)
+                if key in self._seen:
+                    continue
+                self._seen[key] = True
+                if len(self._seen) > MAX_SEEN_EVENTS:
+                    self._seen.popitem(last=False)
+                ts = parse_timestamp(event.get('timestamp'))
+                if ts is None:
+                    continue
+                local = datetime.datetime.fromtimestamp(ts)
+                row = self._camera_row(event.get('camera', 'Unknown'))
+                self._by_hour[row, local.hour] += 1
+                self._by_weekday[row, local.weekday()] += 1
+                self._totals[row] += 1
+                hour = int(ts // 3600)
+                self._advance(hour)
+                if hour > self._head_hour - WINDOW_HOURS:
+                    self._recent[row, hour % WINDOW_HOURS] += 1
+                added += 1
+            if added:
+                self._dirty = True
+                if time.time() - self._last_save >= SAVE_INTERVAL:
+                    self._save_locked()
+        return added
+
+    def snapshot(self):
+        """Return per-camera histograms and rolling 24h/7d totals"""
+        with self._lock:
+            self._load_locked()
+            self._advance(int(time.time() // 3600))
+            import numpy as np
+            last_day = np.arange(self._head_hour - 23, self._head_hour + 1) % WINDOW_HOURS
+            day_totals = self._recent[:, last_day].sum(axis=1)
+            week_totals = self._recent.sum(axis=1)
+            cameras = {
+                camera: {
+                    'by_hour': self._by_hour[row].tolist(),
+                    'by_weekday': self._by_weekday[row].tolist(),
+                    'last_24h': int(day_totals[row]),
+                    'last_7d': int(week_totals[row]),
+                    'total': int(self._totals[row]),
+                }
+                for camera, row in self._cameras.items()
+            }
+            return {
+                'cameras': cameras,
+                'by_hour': self._by_hour.sum(axis=0).tolist(),
+                'by_weekday': self._by_weekday.sum(axis=0).tolist(),
+                'last_24h': int(day_totals.sum()),
+                'last_7d': int(week_totals.sum()),
+                'total': int(self._totals.sum()),
+            }
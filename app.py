@@ -1,21 +1,44 @@
-from flask import Flask, jsonify, request, session
+from quart import Quart, Response, jsonify, request, send_file, session
 import os
-from dotenv import load_dotenv
 import asyncio
-from aiohttp import ClientSession
-from blinkpy.blinkpy import Blink
-from blinkpy.auth import Auth, BlinkTwoFARequiredError
-from functools import wraps
+import atexit
+import datetime
+import importlib
+import logging
+import secrets
+import time
+import traceback
 
-from flask_cors import CORS
+from quart_cors import cors
 
-app = Flask(__name__)
-CORS(app, supports_credentials=True, resources={r"/api/*": {"origins": ["http://localhost:3000", "http://127.0.0.1:3000"]}})
+from http_cache import json_response, forget as forget_responses
+from analytics import ActivityStats, parse_timestamp
+from config_store import ConfigStore
+from export import stream_zip
+from archive import MB, ClipArchive
+from webhooks import WebhookDispatcher
+from ratelimit import RateLimit, RateLimiter
+from telemetry import METRICS, TelemetryStore, parse_range
 
-# Load environment variables
-load_dotenv()
+app = Quart(__name__)
+app = cors(app, allow_credentials=True, allow_origin=["http://localhost:3000", "http://127.0.0.1:3000"])
 
-app.secret_key = os.getenv('FLASK_SECRET_KEY', 'supersecret')
+# Credentials are read from this snapshot rather than os.environ, so edits made
+# through /api/config or to .env by hand take effect without a restart
+config_store = ConfigStore('.env')
+
+# Load the other environment variables
+config_store.export_environ()
+
+app.secret_key = config_store.current.values.get('FLASK_SECRET_KEY') or os.getenv('FLASK_SECRET_KEY', 'supersecret')
+
+# Behind a reverse proxy every request arrives from the proxy, so take the
+# client address from X-Forwarded-For, trusting only this many proxy hops.
+# Left at 0 when clients connect directly, since they could forge the header
+TRUSTED_PROXY_HOPS = int(os.getenv('TRUSTED_PROXY_HOPS', '0'))
+if TRUSTED_PROXY_HOPS > 0:
+    from hypercorn.middleware import ProxyFixMiddleware
+    app.asgi_app = ProxyFixMiddleware(app.asgi_app, mode='legacy', trusted_hops=TRUSTED_PROXY_HOPS)
 
 # Configure session for CORS
 app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
@@ -24,39 +47,439 @@ app.config['SESSION_COOKIE_HTTPONLY'] = True
 # Global blink instance storage
 blink_instances = {}
 
+# One lock per account so concurrent requests share a single start()/refresh()
+blink_locks = {}
+
+# Accounts whose 2FA PIN Blink has already sent, with the time it was sent,
+# so /api/login asks for that PIN instead of triggering another one
+pending_pins = {}
+PIN_VALID_SECONDS = 600
+
+# Per-account camera lookup: stable id/serial -> camera name, plus the time
+# each camera's data was last pulled from Blink
+camera_indexes = {}
+CAMERA_STALE_SECONDS = 30
+
 # Store recent logs for display
 recent_logs = []
 MAX_LOGS = 50
 
 def add_log(message):
     """Add a log message to recent_logs"""
-    import datetime
     timestamp = datetime.datetime.now().strftime("%H:%M:%S")
     recent_logs.append(f"[{timestamp}] {message}")
     if len(recent_logs) > MAX_LOGS:
         recent_logs.pop(0)
     print(f"[{timestamp}] {message}")  # Also print to console
 
-def async_route(f):
-    """Decorator to run async functions in Flask routes"""
-    @wraps(f)
-    def wrapper(*args, **kwargs):
-        return asyncio.run(f(*args, **kwargs))
-    return wrapper
+
+# Camera telemetry history (battery, temperature, armed/motion state)
+telemetry_store = TelemetryStore(os.getenv('TELEMETRY_DIR', os.path.join('data', 'telemetry')), log=add_log)
+atexit.register(telemetry_store.save)
+
+# Motion event counts, updated as events are fetched and saved across restarts
+activity_stats = ActivityStats(os.getenv('ACTIVITY_FILE', os.path.join('data', 'activity.npz')), log=add_log)
+atexit.register(activity_stats.save)
+
+def archive_credentials():
+    """Base URL and auth headers of a logged-in account, for clip downloads"""
+    for blink in list(blink_instances.values()):
+        if blink.auth.token and blink.urls:
+            return blink.urls.base_url, blink.auth.header
+    return None
+
+# Local copies of motion clips, downloaded in the background
+clip_archive = ClipArchive(
+    os.getenv('ARCHIVE_DIR', os.path.join('data', 'archive')),
+    archive_credentials,
+    budget_bytes=int(os.getenv('ARCHIVE_BUDGET_MB', '2048')) * MB,
+    max_age_days=int(os.getenv('ARCHIVE_MAX_AGE_DAYS', '30')),
+    camera_quota_bytes=int(os.getenv('ARCHIVE_CAMERA_QUOTA_MB', '0')) * MB,
+    concurrency=int(os.getenv('ARCHIVE_CONCURRENCY', '2')),
+    log=add_log,
+)
+
+# Outbound notifications for new events and motion, configured as a
+# comma-separated WEBHOOK_URLS list
+webhooks = WebhookDispatcher(
+    [url.strip() for url in os.getenv('WEBHOOK_URLS', '').split(',') if url.strip()],
+    dead_letter_path=os.getenv('WEBHOOK_DEAD_LETTER', os.path.join('data', 'webhooks_dead_letter.jsonl')),
+    state_path=os.getenv('WEBHOOK_STATE', os.path.join('data', 'webhooks_state.json')),
+    batch_window=float(os.getenv('WEBHOOK_BATCH_SECONDS', '2')),
+    per_target_concurrency=int(os.getenv('WEBHOOK_CONCURRENCY', '2')),
+    log=add_log,
+)
+
+# Held open by the one serving process that runs the archive downloads,
+# webhook delivery and background sync
+BACKGROUND_LOCK_PATH = os.path.join('data', 'background.lock')
+background_lock = None
+
+def claim_background_work():
+    """Return True in exactly one serving process, so Hypercorn workers do
+    not each start their own downloader and webhook dispatcher"""
+    global background_lock
+    try:
+        import fcntl
+    except ImportError:  # Windows has no flock; run everything in-process
+        return True
+    os.makedirs(os.path.dirname(BACKGROUND_LOCK_PATH), exist_ok=True)
+    handle = open(BACKGROUND_LOCK_PATH, 'w')
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        handle.close()
+        return False
+    background_lock = handle
+    return True
+
+def new_blink(username, password):
+    """Create a Blink instance whose auth uses the same single HTTP session"""
+    from aiohttp import ClientSession
+    from blinkpy.blinkpy import Blink
+    from blinkpy.auth import Auth
+    http = ClientSession()
+    blink = Blink(session=http)
+    blink.auth = Auth({"username": username, "password": password}, no_prompt=True, session=http)
+    return blink
+
+async def store_blink(key, blink):
+    """Register an account's Blink instance, closing the one it replaces"""
+    old = blink_instances.get(key)
+    blink_instances[key] = blink
+    if old is not None and old is not blink:
+        await old.auth.session.close()
 
 async def get_blink(username, password):
     """Get or create a Blink instance for the given credentials"""
     key = f"{username}:{password}"
-    if key not in blink_instances:
-        blink = Blink(session=ClientSession())
-        auth = Auth({"username": username, "password": password}, no_prompt=True)
-        blink.auth = auth
-        await blink.start()
-        blink_instances[key] = blink
+    async with blink_locks.setdefault(key, asyncio.Lock()):
+        if key not in blink_instances:
+            from blinkpy.auth import BlinkTwoFARequiredError, LoginError
+            blink = new_blink(username, password)
+            try:
+                started = await blink.start()
+            except BlinkTwoFARequiredError:
+                # Blink has just sent a PIN; keep the instance so
+                # /api/verify-pin can finish this login with it
+                await store_blink(key, blink)
+                pending_pins[key] = time.time()
+                raise
+            except BaseException:
+                await blink.auth.session.close()
+                raise
+            # start() swallows login failures and returns False
+            if not started:
+                await blink.auth.session.close()
+                raise LoginError('Blink login failed, check the configured credentials')
+            blink_instances[key] = blink
     return blink_instances[key]
 
+async def refresh_blink(username, password, blink):
+    """Refresh an account, letting concurrent callers share one upstream refresh"""
+    async with blink_locks.setdefault(f"{username}:{password}", asyncio.Lock()):
+        # blink.refresh() is throttled, so callers that waited on the lock
+        # return immediately with the data the first caller fetched
+        return await blink.refresh()
+
+def index_cameras(key, blink):
+    """Rebuild the id/serial lookup for an account after a full refresh"""
+    refreshed = blink.last_refresh or 0
+    by_id = {}
+    for name, camera in blink.cameras.items():
+        if camera.camera_id:
+            by_id[str(camera.camera_id)] = name
+        if camera.serial:
+            by_id[str(camera.serial)] = name
+    camera_indexes[key] = {
+        'by_id': by_id,
+        'refreshed_at': {name: refreshed for name in blink.cameras},
+    }
+    return camera_indexes[key]
+
+async def refresh_camera(key, name, camera):
+    """Pull fresh data for a single camera if its cached state is stale"""
+    index = camera_indexes[key]
+    if time.time() - index['refreshed_at'].get(name, 0) < CAMERA_STALE_SECONDS:
+        return False
+    from blinkpy.sync_module import BlinkSyncModule
+    if type(camera.sync) is not BlinkSyncModule:
+        # Minis and doorbells only have a record in the homescreen, so fetch
+        # that once instead of reading the cached copy
+        await camera.sync.blink.get_homescreen()
+    camera_info = await camera.sync.get_camera_info(camera.camera_id)
+    if not camera_info:
+        return False
+    # Only take the status fields; camera.update() would also fetch sensor
+    # data and download the latest thumbnail and clip
+    camera.extract_config_info(camera_info)
+    index['refreshed_at'][name] = time.time()
+    add_log(f'Refreshed camera {name}')
+    return True
+
+def camera_to_dict(name, camera, refreshed_at=None):
+    """Build the JSON representation of a single camera"""
+    # Get battery info from multiple sources
+    battery = camera.battery
+    if battery is None or battery == '':
+        # Try battery_state
+        battery = getattr(camera, 'battery_state', None)
+    if battery is None or battery == '':
+        # Try attributes dict
+        if hasattr(camera, 'attributes') and isinstance(camera.attributes, dict):
+            battery = camera.attributes.get('battery_state', None) or camera.attributes.get('battery', None)
+    if battery is None or battery == '':
+        # Try battery_voltage
+        battery_voltage = getattr(camera, 'battery_voltage', None)
+        if battery_voltage:
+            battery = f"{battery_voltage}V"
+    if battery is None or battery == '':
+        # Check if it's a wired camera
+        if hasattr(camera, 'attributes') and isinstance(camera.attributes, dict):
+            if camera.attributes.get('type') in ['mini', 'doorbell']:
+                battery = 'Wired'
+            else:
+                battery = 'Unknown'
+        else:
+            battery = 'Unknown'
+    
+    # Get temperature from multiple sources
+    temperature = camera.temperature
+    if temperature is None:
+        # Try temperature_c and convert to F
+        temp_c = getattr(camera, 'temperature_c', None)
+        if temp_c is not None:
+            temperature = int(temp_c * 9/5 + 32)
+    if temperature is None:
+        # Try attributes dict
+        if hasattr(camera, 'attributes') and isinstance(camera.attributes, dict):
+            temperature = camera.attributes.get('temperature', None)
+            if temperature is None:
+                temp_c = camera.attributes.get('temperature_c', None)
+                if temp_c is not None:
+                    temperature = int(temp_c * 9/5 + 32)
+    if temperature is None:
+        temperature = 'N/A'
+    
+    add_log(f'Camera {name}: battery={battery}, temp={temperature}')
+    
+    # Debug: log camera attributes to find motion/notification fields
+    if hasattr(camera, 'attributes') and isinstance(camera.attributes, dict):
+        add_log(f'Camera {name} attributes keys: {list(camera.attributes.keys())}')
+    
+    # Get motion and notification status
+    motion_enabled = getattr(camera, 'motion_enabled', None)
+    add_log(f'Camera {name} motion_enabled property: {motion_enabled}')
+    
+    # Check attributes dict if property doesn't exist
+    if motion_enabled is None and hasattr(camera, 'attributes') and isinstance(camera.attributes, dict):
+        motion_enabled = camera.attributes.get('motion_detection', None)
+        add_log(f'Camera {name} motion_detection from attributes: {motion_enabled}')
+    if motion_enabled is None:
+        motion_enabled = True  # Default to True if unknown
+    
+    # For notifications, check if snoozed
+    notifications_snoozed = getattr(camera, 'notifications_snoozed', None)
+    add_log(f'Camera {name} notifications_snoozed property: {notifications_snoozed}')
+    
+    if notifications_snoozed is None and hasattr(camera, 'attributes') and isinstance(camera.attributes, dict):
+        notifications_snoozed = camera.attributes.get('notifications_snoozed', None)
+        add_log(f'Camera {name} notifications_snoozed from attributes: {notifications_snoozed}')
+    notifications_enabled = not notifications_snoozed if notifications_snoozed is not None else True
+    
+    add_log(f'Camera {name}: FINAL motion_enabled={motion_enabled}, notifications_enabled={notifications_enabled}')
+    
+    return {
+        'id': camera.camera_id,
+        'serial': camera.serial,
+        'name': name,
+        'armed': getattr(camera, 'arm', False),
+        'battery': battery,
+        'temperature': temperature,
+        'motion_detected': getattr(camera, 'motion_detected', False),
+        'motion_enabled': motion_enabled,
+        'notifications_enabled': notifications_enabled,
+        'thumbnail': getattr(camera, 'thumbnail', None),
+        # Report when the data was pulled, so unchanged cameras hash the same
+        'updated_at': datetime.datetime.fromtimestamp(refreshed_at or time.time()).strftime("%I:%M:%S %p")
+    }
+
+def sync_cameras(key, blink):
+    """Build camera dicts after a refresh, recording telemetry and motion changes"""
+    refreshed_at = index_cameras(key, blink)['refreshed_at']
+    cameras = []
+    for name, camera in blink.cameras.items():
+        data = camera_to_dict(name, camera, refreshed_at[name])
+        record_telemetry(name, camera, data, refreshed_at[name])
+        cameras.append(data)
+    webhooks.publish_snapshot(cameras)
+    return cameras
+
+def record_telemetry(name, camera, data, refreshed_at):
+    """Store the numeric telemetry from a camera snapshot"""
+    # Battery level is in signal bars and voltage in hundredths of a volt, so
+    # each gets its own series; non-numeric values are skipped by the store
+    voltage = getattr(camera, 'battery_voltage', None)
+    telemetry_store.record(name, {
+        'battery': getattr(camera, 'battery_level', None),
+        'battery_voltage': voltage / 100 if isinstance(voltage, (int, float)) else None,
+        'temperature': data['temperature'],
+        'armed': data['armed'] is True,
+        'motion': bool(data['motion_detected']),
+    }, refreshed_at)
+
+# Rate limiting, per client IP unless marked per_client=False. Every session
+# logs into the same configured account, so the session username would put
+# all clients in one bucket; without an IP the session gets its own id
+MAX_LOGIN_ATTEMPTS = 10 # Increased for testing
+LOGIN_WINDOW = 300  # 5 minutes
+LOCKOUT_DURATION = 300 # 5 minutes
+
+DEFAULT_RATE_LIMIT = RateLimit('default', 300, 60)
+# Routes that call Blink also share one account-wide budget, of which a
+# single client may use at most half
+UPSTREAM_RATE_LIMIT = RateLimit('upstream', 120, 60, per_client=False)
+UPSTREAM_CLIENT_RATE_LIMIT = RateLimit('upstream_client', 60, 60)
+UPSTREAM_ROUTES = {
+    'get_cameras_route', 'get_camera_route', 'arm_camera', 'disarm_camera',
+    'request_snapshot', 'toggle_motion_detection', 'toggle_notifications',
+    'get_thumbnail', 'get_events', 'export_events',
+}
+RATE_LIMITS = {
+    'login': RateLimit('login', MAX_LOGIN_ATTEMPTS, LOGIN_WINDOW, lockout=LOCKOUT_DURATION,
+                       message='Too many login attempts'),
+    'verify_pin': RateLimit('verify_pin', 5, LOGIN_WINDOW, message='Too many PIN attempts'),
+    'get_cameras_route': RateLimit('cameras', 60, 60),
+    'get_camera_route': RateLimit('camera', 120, 60),
+    'request_snapshot': RateLimit('snapshot', 6, 60),
+    'get_thumbnail': RateLimit('thumbnail', 60, 60),
+    'get_events': RateLimit('events', 30, 60),
+    'update_config': RateLimit('config', 10, 60),
+    'export_events': RateLimit('export', 5, 300),
+}
+RATE_LIMIT_EXEMPT = {'health_live', 'health_ready', 'static'}
+rate_limiter = RateLimiter(max_keys=10000)
+
+def rate_limit_client():
+    """The client IP, or a per-session id when the server sees no address
+    (e.g. bound to a unix socket)"""
+    if request.remote_addr and request.remote_addr != '<local>':
+        return request.remote_addr
+    if 'client_id' not in session:
+        session['client_id'] = secrets.token_hex(8)
+    return f"session:{session['client_id']}"
+
+def format_wait(wait_seconds):
+    minutes = wait_seconds // 60
+    seconds = wait_seconds % 60
+    return f"{minutes}m {seconds}s" if minutes > 0 else f"{seconds}s"
+
+@app.before_request
+async def apply_rate_limits():
+    """Reject requests over their route's limit with 429 and Retry-After"""
+    if request.method == 'OPTIONS' or request.endpoint in RATE_LIMIT_EXEMPT:
+        return None
+    client = rate_limit_client()
+    rules = [RATE_LIMITS.get(request.endpoint, DEFAULT_RATE_LIMIT)]
+    if request.endpoint in UPSTREAM_ROUTES:
+        # Per-client rules first; the shared budget is only charged when all pass
+        rules += [UPSTREAM_CLIENT_RATE_LIMIT, UPSTREAM_RATE_LIMIT]
+    rule, retry_after = rate_limiter.hit_all(rules, client)
+    if rule is not None:
+        add_log(f'Rate limit {rule.name} hit by {client}')
+        response = jsonify({'error': f'{rule.message}. Please wait {format_wait(retry_after)}.'})
+        response.status_code = 429
+        response.headers['Retry-After'] = str(retry_after)
+        return response
+    return None
+
+# Background warm-up state, reported by the health endpoints
+warm_state = {'status': 'starting', 'started_at': time.time(), 'ready_at': None, 'error': None}
+WARM_MAX_ATTEMPTS = 5
+WARM_RETRY_MAX_SECONDS = 300
+
+def mark_ready():
+    """Report ready once any path (warm-up, login or PIN) has started the account"""
+    warm_state.update(status='ready', error=None, ready_at=warm_state['ready_at'] or time.time())
+
+async def warm_up():
+    """Load heavy modules, log in with the configured account and load cameras.
+
+    Transient failures are retried with a capped backoff for as long as the
+    server runs. After WARM_MAX_ATTEMPTS the server reports ready but cold:
+    requests still work, they just pay for the login themselves.
+    """
+    warm_state['status'] = 'warming'
+    # Imports and file loading run in a thread so the loop keeps serving
+    await asyncio.to_thread(importlib.import_module, 'blinkpy.blinkpy')
+    await asyncio.to_thread(telemetry_store.load)
+    await asyncio.to_thread(activity_stats.load)
+    
+    from blinkpy.auth import BlinkTwoFARequiredError, LoginError, UnauthorizedError
+    delay = 10
+    attempt = 0
+    while warm_state['status'] != 'ready':
+        config = config_store.current
+        username = config.blink_username
+        password = config.blink_password
+        if not username or not password:
+            mark_ready()
+            add_log('Warm-up complete (no credentials configured)')
+            return
+        key = f"{username}:{password}"
+        attempt += 1
+        try:
+            blink = await get_blink(username, password)
+            await refresh_blink(username, password, blink)
+            index_cameras(key, blink)
+            mark_ready()
+            add_log(f'Warm-up complete: {len(blink.cameras)} cameras loaded')
+            return
+        except BlinkTwoFARequiredError:
+            # get_blink() kept the instance, so the PIN Blink just sent can
+            # be entered through /api/verify-pin
+            warm_state.update(status='needs_2fa', ready_at=time.time())
+            add_log('Warm-up stopped: 2FA PIN sent, enter it to finish logging in')
+            return
+        except (LoginError, UnauthorizedError) as e:
+            # Retrying bad credentials only risks locking the account
+            warm_state.update(status='failed', error=str(e) or 'Blink rejected the credentials')
+            add_log(f"Warm-up stopped: {warm_state['error']}")
+            return
+        except Exception as e:
+            # Start over with a fresh instance on the next attempt
+            blink = blink_instances.pop(key, None)
+            if blink is not None:
+                await blink.auth.session.close()
+            warm_state['error'] = str(e)
+            if attempt == WARM_MAX_ATTEMPTS:
+                warm_state['status'] = 'failed'
+            add_log(f'Warm-up attempt {attempt} failed, retrying in {delay}s: {e}')
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, WARM_RETRY_MAX_SECONDS)
+
+@app.before_serving
+async def start_warm_up():
+    if os.getenv('WARM_START', 'true').lower() == 'true':
+        app.add_background_task(warm_up)
+    else:
+        warm_state.update(status='ready', ready_at=time.time())
+
+@app.before_serving
+async def start_background_work():
+    # Started here rather than at import, so importing the app (tests,
+    # reloads) starts no threads
+    config_store.watch(log=add_log)
+    if not claim_background_work():
+        add_log('Archive, webhooks and background sync run in another worker')
+        return
+    if os.getenv('ARCHIVE_ENABLED', 'true').lower() == 'true':
+        clip_archive.start()
+    webhooks.start()
+    if SYNC_INTERVAL > 0:
+        app.add_background_task(background_sync)
+
 @app.route('/api/cameras', methods=['GET'])
-@async_route
 async def get_cameras_route():
     username = session.get('username')
     password = session.get('password')
@@ -67,101 +490,63 @@ async def get_cameras_route():
     
     try:
         blink = await get_blink(username, password)
-        # Refresh session for the new event loop
-        new_session = ClientSession()
-        blink.session = new_session
-        blink.auth.session = new_session
-        await blink.refresh()
-        cameras = []
-        for name, camera in blink.cameras.items():
-            # Get battery info from multiple sources
-            battery = camera.battery
-            if battery is None or battery == '':
-                # Try battery_state
-                battery = getattr(camera, 'battery_state', None)
-            if battery is None or battery == '':
-                # Try attributes dict
-                if hasattr(camera, 'attributes') and isinstance(camera.attributes, dict):
-                    battery = camera.attributes.get('battery_state', None) or camera.attributes.get('battery', None)
-            if battery is None or battery == '':
-                # Try battery_voltage
-                battery_voltage = getattr(camera, 'battery_voltage', None)
-                if battery_voltage:
-                    battery = f"{battery_voltage}V"
-            if battery is None or battery == '':
-                # Check if it's a wired camera
-                if hasattr(camera, 'attributes') and isinstance(camera.attributes, dict):
-                    if camera.attributes.get('type') in ['mini', 'doorbell']:
-                        battery = 'Wired'
-                    else:
-                        battery = 'Unknown'
-                else:
-                    battery = 'Unknown'
-            
-            # Get temperature from multiple sources
-            temperature = camera.temperature
-            if temperature is None:
-                # Try temperature_c and convert to F
-                temp_c = getattr(camera, 'temperature_c', None)
-                if temp_c is not None:
-                    temperature = int(temp_c * 9/5 + 32)
-            if temperature is None:
-                # Try attributes dict
-                if hasattr(camera, 'attributes') and isinstance(camera.attributes, dict):
-                    temperature = camera.attributes.get('temperature', None)
-                    if temperature is None:
-                        temp_c = camera.attributes.get('temperature_c', None)
-                        if temp_c is not None:
-                            temperature = int(temp_c * 9/5 + 32)
-            if temperature is None:
-                temperature = 'N/A'
-            
-            add_log(f'Camera {name}: battery={battery}, temp={temperature}')
-            
-            # Debug: log camera attributes to find motion/notification fields
-            if hasattr(camera, 'attributes') and isinstance(camera.attributes, dict):
-                add_log(f'Camera {name} attributes keys: {list(camera.attributes.keys())}')
-            
-            # Get motion and notification status
-            motion_enabled = getattr(camera, 'motion_enabled', None)
-            add_log(f'Camera {name} motion_enabled property: {motion_enabled}')
-            
-            # Check attributes dict if property doesn't exist
-            if motion_enabled is None and hasattr(camera, 'attributes') and isinstance(camera.attributes, dict):
-                motion_enabled = camera.attributes.get('motion_detection', None)
-                add_log(f'Camera {name} motion_detection from attributes: {motion_enabled}')
-            if motion_enabled is None:
-                motion_enabled = True  # Default to True if unknown
-            
-            # For notifications, check if snoozed
-            notifications_snoozed = getattr(camera, 'notifications_snoozed', None)
-            add_log(f'Camera {name} notifications_snoozed property: {notifications_snoozed}')
-            
-            if notifications_snoozed is None and hasattr(camera, 'attributes') and isinstance(camera.attributes, dict):
-                notifications_snoozed = camera.attributes.get('notifications_snoozed', None)
-                add_log(f'Camera {name} notifications_snoozed from attributes: {notifications_snoozed}')
-            notifications_enabled = not notifications_snoozed if notifications_snoozed is not None else True
-            
-            add_log(f'Camera {name}: FINAL motion_enabled={motion_enabled}, notifications_enabled={notifications_enabled}')
-            
-            import datetime
-            cameras.append({
-                'name': name,
-                'armed': getattr(camera, 'arm', False),
-                'battery': battery,
-                'temperature': temperature,
-                'motion_detected': getattr(camera, 'motion_detected', False),
-                'motion_enabled': motion_enabled,
-                'notifications_enabled': notifications_enabled,
-                'thumbnail': getattr(camera, 'thumbnail', None),
-                'updated_at': datetime.datetime.now().strftime("%I:%M:%S %p")
-            })
-        return jsonify(cameras)
+        await refresh_blink(username, password, blink)
+        key = f"{username}:{password}"
+        cameras = sync_cameras(key, blink)
+        return json_response(cameras, cache_key=f"{key}:cameras")
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/cameras/<camera_id>', methods=['GET'])
+async def get_camera_route(camera_id):
+    """Get a single camera by id or serial, refreshing only that camera"""
+    username = session.get('username')
+    password = session.get('password')
+    if not username or not password:
+        return jsonify({'error': 'Not logged in'}), 401
+    
+    try:
+        key = f"{username}:{password}"
+        blink = await get_blink(username, password)
+        index = camera_indexes.get(key) or index_cameras(key, blink)
+        name = index['by_id'].get(camera_id)
+        if name is None or name not in blink.cameras:
+            return jsonify({'error': 'Camera not found'}), 404
+        
+        camera = blink.cameras[name]
+        refreshed = await refresh_camera(key, name, camera)
+        data = camera_to_dict(name, camera, index['refreshed_at'].get(name))
+        if refreshed:
+            record_telemetry(name, camera, data, index['refreshed_at'][name])
+        return json_response(data, cache_key=f"{key}:camera:{name}")
     except Exception as e:
+        add_log(f'Camera detail error: {str(e)}')
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/cameras/<camera_name>/history', methods=['GET'])
+async def get_camera_history(camera_name):
+    """Get a camera metric over a time range, e.g. ?metric=battery&range=7d"""
+    if not session.get('username') or not session.get('password'):
+        return jsonify({'error': 'Not logged in'}), 401
+    
+    metric = request.args.get('metric', 'battery')
+    if metric not in METRICS:
+        return jsonify({'error': f"Unknown metric '{metric}', expected one of {', '.join(METRICS)}"}), 400
+    try:
+        seconds = parse_range(request.args.get('range', '24h'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    resolution, points = telemetry_store.history(camera_name, metric, seconds)
+    return json_response({
+        'camera': camera_name,
+        'metric': metric,
+        'range': seconds,
+        'resolution': resolution,
+        'points': points
+    })
+
 @app.route('/api/camera/<camera_name>/arm', methods=['POST'])
-@async_route
 async def arm_camera(camera_name):
     username = session.get('username')
     password = session.get('password')
@@ -170,10 +555,6 @@ async def arm_camera(camera_name):
     
     try:
         blink = await get_blink(username, password)
-        # Refresh session for the new event loop
-        new_session = ClientSession()
-        blink.session = new_session
-        blink.auth.session = new_session
         if camera_name in blink.cameras:
             await blink.cameras[camera_name].async_arm(True)
             return jsonify({'status': 'success'})
@@ -182,7 +563,6 @@ async def arm_camera(camera_name):
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/camera/<camera_name>/disarm', methods=['POST'])
-@async_route
 async def disarm_camera(camera_name):
     username = session.get('username')
     password = session.get('password')
@@ -191,10 +571,6 @@ async def disarm_camera(camera_name):
     
     try:
         blink = await get_blink(username, password)
-        # Refresh session for the new event loop
-        new_session = ClientSession()
-        blink.session = new_session
-        blink.auth.session = new_session
         if camera_name in blink.cameras:
             await blink.cameras[camera_name].async_arm(False)
             return jsonify({'status': 'success'})
@@ -203,7 +579,6 @@ async def disarm_camera(camera_name):
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/camera/<camera_name>/snapshot', methods=['POST'])
-@async_route
 async def request_snapshot(camera_name):
     """Request a new snapshot from the camera"""
     username = session.get('username')
@@ -213,11 +588,6 @@ async def request_snapshot(camera_name):
     
     try:
         blink = await get_blink(username, password)
-        # Refresh session for the new event loop
-        new_session = ClientSession()
-        blink.session = new_session
-        blink.auth.session = new_session
-        
         if camera_name in blink.cameras:
             camera = blink.cameras[camera_name]
             await camera.snap_picture()
@@ -229,7 +599,6 @@ async def request_snapshot(camera_name):
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/camera/<camera_name>/motion', methods=['POST'])
-@async_route
 async def toggle_motion_detection(camera_name):
     """Toggle motion detection on/off for a camera"""
     username = session.get('username')
@@ -237,15 +606,11 @@ async def toggle_motion_detection(camera_name):
     if not username or not password:
         return jsonify({'error': 'Not logged in'}), 401
     
-    data = request.get_json() or {}
+    data = (await request.get_json(silent=True)) or {}
     enabled = data.get('enabled', True)
     
     try:
         blink = await get_blink(username, password)
-        new_session = ClientSession()
-        blink.session = new_session
-        blink.auth.session = new_session
-        
         if camera_name in blink.cameras:
             camera = blink.cameras[camera_name]
             # Use async_arm instead of deprecated set_motion_detect
@@ -258,7 +623,6 @@ async def toggle_motion_detection(camera_name):
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/camera/<camera_name>/notifications', methods=['POST'])
-@async_route
 async def toggle_notifications(camera_name):
     """Toggle notification snooze on/off for a camera"""
     username = session.get('username')
@@ -266,15 +630,11 @@ async def toggle_notifications(camera_name):
     if not username or not password:
         return jsonify({'error': 'Not logged in'}), 401
     
-    data = request.get_json() or {}
+    data = (await request.get_json(silent=True)) or {}
     enabled = data.get('enabled', True)
     
     try:
         blink = await get_blink(username, password)
-        new_session = ClientSession()
-        blink.session = new_session
-        blink.auth.session = new_session
-        
         if camera_name in blink.cameras:
             camera = blink.cameras[camera_name]
             # Snooze notifications means disable them
@@ -299,7 +659,6 @@ async def toggle_notifications(camera_name):
 
 
 @app.route('/api/camera/<camera_name>/thumbnail', methods=['GET'])
-@async_route
 async def get_thumbnail(camera_name):
     """Get the thumbnail image for a camera"""
     username = session.get('username')
@@ -309,18 +668,12 @@ async def get_thumbnail(camera_name):
     
     try:
         blink = await get_blink(username, password)
-        # Refresh session for the new event loop
-        new_session = ClientSession()
-        blink.session = new_session
-        blink.auth.session = new_session
-        
         if camera_name in blink.cameras:
             camera = blink.cameras[camera_name]
             # Get the thumbnail image
             response = await camera.get_media()
             if response:
                 image_data = await response.read()
-                from flask import Response
                 return Response(image_data, mimetype='image/jpeg')
             return jsonify({'error': 'No thumbnail available'}), 404
         return jsonify({'error': 'Camera not found'}), 404
@@ -328,8 +681,28 @@ async def get_thumbnail(camera_name):
         add_log(f'Thumbnail error: {str(e)}')
         return jsonify({'error': str(e)}), 500
 
+def video_to_event(video):
+    """Build the JSON representation of a Blink video record"""
+    return {
+        'camera': video.get('device_name', 'Unknown'),
+        'timestamp': video.get('created_at', 'unknown'),
+        'type': 'motion',
+        'thumbnail': video.get('thumbnail', None),
+        'video_url': video.get('media', None),
+        'id': video.get('id', None)
+    }
+
+async def sync_events(blink, since=None):
+    """Fetch recent events and feed them to the stats, archive and webhooks"""
+    videos = await blink.get_videos_metadata(since=since, stop=3)
+    events = [video_to_event(video) for video in videos]
+    activity_stats.ingest(events)
+    # enqueue() writes the archive index, so keep it off the event loop
+    await asyncio.to_thread(clip_archive.enqueue, events)
+    webhooks.publish_events(events)
+    return events
+
 @app.route('/api/events', methods=['GET'])
-@async_route
 async def get_events():
     username = session.get('username')
     password = session.get('password')
@@ -338,80 +711,180 @@ async def get_events():
     
     try:
         blink = await get_blink(username, password)
-        # Refresh session for the new event loop
-        new_session = ClientSession()
-        blink.session = new_session
-        blink.auth.session = new_session
-        await blink.refresh()
-        
-        # Get videos from the last 24 hours
-        videos = await blink.get_videos_metadata(since=None, stop=3)
-        
-        events = []
-        for video in videos:
-            events.append({
-                'camera': video.get('device_name', 'Unknown'),
-                'timestamp': video.get('created_at', 'unknown'),
-                'type': 'motion',
-                'thumbnail': video.get('thumbnail', None),
-                'video_url': video.get('media', None),
-                'id': video.get('id', None)
-            })
+        await refresh_blink(username, password, blink)
         
-        return jsonify(events)
+        # Get videos since the last refresh
+        events = await sync_events(blink)
+        return json_response(events, cache_key=f"{username}:{password}:events")
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-def update_env_file(key, value):
-    """Update or add a key-value pair in the .env file"""
-    env_path = '.env'
-    lines = []
-    key_found = False
+# Seconds between background syncs of the configured account (0 disables),
+# and how far each sync looks back past the previous one for late uploads
+SYNC_INTERVAL = int(os.getenv('SYNC_INTERVAL_SECONDS', '60'))
+SYNC_OVERLAP = 600
+
+async def background_sync():
+    """Refresh the configured account on an interval, so webhooks, the archive
+    and the stores keep up even when no dashboard is open"""
+    since = time.time() - 86400
+    while True:
+        await asyncio.sleep(SYNC_INTERVAL)
+        config = config_store.current
+        username = config.blink_username
+        password = config.blink_password
+        key = f"{username}:{password}"
+        blink = blink_instances.get(key)
+        # Only sync an account that warm-up or a login has started; logging in
+        # from here could send 2FA PINs nobody asked for
+        if blink is None or not blink.available:
+            continue
+        started = time.time()
+        try:
+            await refresh_blink(username, password, blink)
+            sync_cameras(key, blink)
+            await sync_events(blink, since=datetime.datetime.fromtimestamp(since).strftime('%Y/%m/%d %H:%M:%S'))
+            since = started - SYNC_OVERLAP
+        except Exception as e:
+            add_log(f'Background sync failed: {e}')
+
+# Upper bound on metadata pages (~25 events each) read for one export
+EXPORT_MAX_PAGES = 100
+
+async def iter_export_events(blink, start, end, cameras, manifest_info):
+    """Page through Blink's video metadata, yielding events in the export window.
+
+    Sets manifest_info['truncated'] when the page cap is hit before Blink
+    runs out of events, or with an 'error' when Blink returns no usable
+    page, since later events in the window were not read.
+    """
+    from blinkpy import api
+    for page in range(1, EXPORT_MAX_PAGES + 1):
+        response = await api.request_videos(blink, time=start, page=page)
+        try:
+            videos = response['media']
+        except (KeyError, TypeError):
+            manifest_info.update(truncated=True, error=f'Blink returned no event list for page {page}')
+            add_log(f"Export stopped early: {manifest_info['error']} ({str(response)[:200]})")
+            return
+        if not videos:
+            return
+        for video in videos:
+            if video.get('deleted'):
+                continue
+            event = video_to_event(video)
+            created = parse_timestamp(event['timestamp'])
+            if created is None or created < start or created > end:
+                continue
+            if cameras and event['camera'] not in cameras:
+                continue
+            yield event
+    manifest_info['truncated'] = True
+    add_log(f'Export truncated after {EXPORT_MAX_PAGES} pages of events; narrow the time range to get the rest')
+
+@app.route('/api/events/export', methods=['GET'])
+async def export_events():
+    """Stream a ZIP of clips, thumbnails and a manifest for ?from=&to=&camera="""
+    username = session.get('username')
+    password = session.get('password')
+    if not username or not password:
+        return jsonify({'error': 'Not logged in'}), 401
     
-    if os.path.exists(env_path):
-        with open(env_path, 'r') as f:
-            lines = f.readlines()
-            
-    new_lines = []
-    for line in lines:
-        if line.startswith(f"{key}="):
-            new_lines.append(f"{key}={value}\n")
-            key_found = True
-        else:
-            new_lines.append(line)
-            
-    if not key_found:
-        if new_lines and not new_lines[-1].endswith('\n'):
-             new_lines.append('\n')
-        new_lines.append(f"{key}={value}\n")
-        
-    with open(env_path, 'w') as f:
-        f.writelines(new_lines)
+    now = time.time()
+    start = parse_timestamp(request.args['from']) if request.args.get('from') else now - 86400
+    end = parse_timestamp(request.args['to']) if request.args.get('to') else now
+    if start is None or end is None or start > end:
+        return jsonify({'error': 'from and to must be ISO dates or datetimes, with from before to'}), 400
+    cameras = {name.strip() for value in request.args.getlist('camera') for name in value.split(',') if name.strip()}
+    
+    try:
+        blink = await get_blink(username, password)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    
+    from blinkpy import api
+    from blinkpy.helpers.constants import TIMEOUT_MEDIA
+    
+    async def fetch(path):
+        # Video thumbnails come without an extension, like camera thumbnails
+        if '/thumbnail' in path and not path.split('?')[0].endswith('.jpg'):
+            path = f"{path}.jpg"
+        url = path if path.startswith('http') else f"{blink.urls.base_url}{path}"
+        response = await api.http_get(blink, url=url, stream=True, json=False, timeout=TIMEOUT_MEDIA)
+        if response is None or response.status != 200:
+            return None
+        return await response.read()
+    
+    manifest_info = {
+        'from': datetime.datetime.fromtimestamp(start, datetime.timezone.utc).isoformat(),
+        'to': datetime.datetime.fromtimestamp(end, datetime.timezone.utc).isoformat(),
+        'cameras': sorted(cameras) or 'all',
+        'truncated': False,
+    }
+    add_log(f"Exporting events {manifest_info['from']} to {manifest_info['to']} for {manifest_info['cameras']}")
+    filename = f"blink-events-{datetime.datetime.fromtimestamp(start).strftime('%Y%m%d-%H%M')}.zip"
+    body = stream_zip(iter_export_events(blink, start, end, cameras, manifest_info), fetch,
+                      clip_archive.path_for, manifest_info)
+    response = Response(body, mimetype='application/zip')
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response.timeout = None
+    return response
+
+@app.route('/api/stats/activity', methods=['GET'])
+async def get_activity_stats():
+    """Per-camera event counts by hour of day and weekday, plus rolling totals"""
+    if not session.get('username') or not session.get('password'):
+        return jsonify({'error': 'Not logged in'}), 401
+    return json_response(activity_stats.snapshot())
+
+@app.route('/api/archive', methods=['GET'])
+async def get_archive_status():
+    """Clip archive download counts and storage use"""
+    if not session.get('username') or not session.get('password'):
+        return jsonify({'error': 'Not logged in'}), 401
+    return jsonify(clip_archive.status())
+
+@app.route('/api/archive/<clip_id>', methods=['GET'])
+async def get_archived_clip(clip_id):
+    """Serve a locally archived clip"""
+    if not session.get('username') or not session.get('password'):
+        return jsonify({'error': 'Not logged in'}), 401
+    path = clip_archive.path_for(clip_id)
+    if path is None:
+        return jsonify({'error': 'Clip not archived'}), 404
+    return await send_file(os.path.abspath(path), mimetype='video/mp4', conditional=True)
+
+@app.route('/api/archive/<clip_id>/keep', methods=['POST'])
+async def keep_archived_clip(clip_id):
+    """Flag a clip so retention never deletes it"""
+    if not session.get('username') or not session.get('password'):
+        return jsonify({'error': 'Not logged in'}), 401
+    data = (await request.get_json(silent=True)) or {}
+    keep = data.get('keep', True)
+    if not await asyncio.to_thread(clip_archive.flag, clip_id, keep):
+        return jsonify({'error': 'Clip not found'}), 404
+    return jsonify({'status': 'success', 'keep': bool(keep)})
+
+@app.route('/api/webhooks/stats', methods=['GET'])
+async def get_webhook_stats():
+    """Webhook queue depth, throughput and delivery latency"""
+    if not session.get('username') or not session.get('password'):
+        return jsonify({'error': 'Not logged in'}), 401
+    return jsonify(webhooks.stats())
 
 @app.route('/api/config', methods=['GET'])
-def get_config():
+async def get_config():
     """Check if credentials are configured"""
-    username = os.getenv('BLINK_USERNAME')
-    password = os.getenv('BLINK_PASSWORD')
-    
-    masked_username = None
-    if username:
-        # Simple masking
-        parts = username.split('@')
-        if len(parts) == 2:
-            masked_username = f"{parts[0][:1]}***@{parts[1]}"
-        else:
-            masked_username = f"{username[:1]}***"
-            
-    return jsonify({
-        'has_credentials': bool(username and password),
-        'username': masked_username
+    config = config_store.current
+    return json_response({
+        'has_credentials': bool(config.blink_username and config.blink_password),
+        'username': config.masked_username
     })
 
 @app.route('/api/config', methods=['POST'])
-def update_config():
+async def update_config():
     """Update Blink credentials in .env"""
-    data = request.json
+    data = (await request.get_json(silent=True)) or {}
     username = data.get('username')
     password = data.get('password')
     
@@ -419,64 +892,44 @@ def update_config():
         return jsonify({'error': 'Username and password are required'}), 400
         
     try:
-        update_env_file('BLINK_USERNAME', username)
-        update_env_file('BLINK_PASSWORD', password)
-        
-        # Reload environment variables
-        os.environ['BLINK_USERNAME'] = username
-        os.environ['BLINK_PASSWORD'] = password
-        
+        await asyncio.to_thread(config_store.update, BLINK_USERNAME=username, BLINK_PASSWORD=password)
         return jsonify({'status': 'success', 'message': 'Configuration updated'})
     except Exception as e:
         return jsonify({'error': f'Failed to update config: {str(e)}'}), 500
 
-# Rate limiting globals
-login_attempts = []
-MAX_LOGIN_ATTEMPTS = 10 # Increased for testing
-LOGIN_WINDOW = 300  # 5 minutes
-LOCKOUT_DURATION = 300 # 5 minutes
-lockout_until = 0
-
 @app.route('/api/login', methods=['POST'])
-@async_route
 async def login():
-    import logging
-    import time
-    import json
+    # blinkpy and aiohttp are imported on first use to keep startup fast
+    from aiohttp import ClientSession
+    from blinkpy.auth import BlinkTwoFARequiredError
     
-    global lockout_until, login_attempts
-    
-    current_time = time.time()
-    
-    # Check if locked out
-    if current_time < lockout_until:
-        wait_seconds = int(lockout_until - current_time)
-        minutes = wait_seconds // 60
-        seconds = wait_seconds % 60
-        time_str = f"{minutes}m {seconds}s" if minutes > 0 else f"{seconds}s"
-        return jsonify({'error': f'Too many login attempts. Please wait {time_str}.'}), 429
-
-    # Clean up old attempts
-    login_attempts = [t for t in login_attempts if current_time - t < LOGIN_WINDOW]
-    
-    if len(login_attempts) >= MAX_LOGIN_ATTEMPTS:
-        lockout_until = current_time + LOCKOUT_DURATION
-        wait_seconds = LOCKOUT_DURATION
-        minutes = wait_seconds // 60
-        seconds = wait_seconds % 60
-        time_str = f"{minutes}m {seconds}s" if minutes > 0 else f"{seconds}s"
-        return jsonify({'error': f'Too many login attempts. Please wait {time_str}.'}), 429
-
-    # Record this attempt
-    login_attempts.append(current_time)
-
-    username = os.getenv('BLINK_USERNAME')
-    password = os.getenv('BLINK_PASSWORD')
+    config = config_store.current
+    username = config.blink_username
+    password = config.blink_password
     
     if not username or not password:
         logging.error('Missing Blink credentials in environment variables')
         return jsonify({'error': 'Server misconfiguration: missing credentials'}), 500
     
+    key = f"{username}:{password}"
+    # Waits for a warm-up that is still starting this account
+    async with blink_locks.setdefault(key, asyncio.Lock()):
+        blink = blink_instances.get(key)
+        if blink is not None and blink.available and blink.cameras:
+            add_log(f"Login reused the warmed-up Blink session: {len(blink.cameras)} cameras")
+            if key not in camera_indexes:
+                index_cameras(key, blink)
+            mark_ready()
+            session['username'] = username
+            session['password'] = password
+            return jsonify({'status': 'success', 'cameras': len(blink.cameras)})
+        # Only the first login uses a PIN sent during warm-up; logging in
+        # again sends a new one
+        sent_at = pending_pins.pop(key, None)
+        if blink is not None and sent_at is not None and time.time() - sent_at < PIN_VALID_SECONDS:
+            add_log('Login is waiting for the 2FA PIN sent during warm-up')
+            return jsonify({'status': '2fa_required'})
+    
     try:
         add_log("Login attempt started")
         
@@ -495,8 +948,8 @@ async def login():
         }
         
         add_log("Sending raw login request to Blink...")
-        async with ClientSession() as session:
-            async with session.post("https://api.oauth.blink.com/oauth/token", data=data, headers=headers) as response:
+        async with ClientSession() as http:
+            async with http.post("https://api.oauth.blink.com/oauth/token", data=data, headers=headers) as response:
                 status = response.status
                 text = await response.text()
                 add_log(f"Raw login response: Status={status}, Body={text}")
@@ -508,21 +961,16 @@ async def login():
                     # But we need to initialize blink object for later.
                     
                     # Re-initialize blink object so we have it for verification
-                    blink = Blink(session=ClientSession())
-                    auth = Auth({"username": username, "password": password}, no_prompt=True)
-                    blink.auth = auth
+                    blink = new_blink(username, password)
                     # We don't call start() because it might fail/swallow error.
                     # We just store it for the PIN verification step.
-                    key = f"{username}:{password}"
-                    blink_instances[key] = blink
+                    await store_blink(key, blink)
                     return jsonify({'status': '2fa_required'})
                 
                 elif status == 200:
                     add_log("Login successful from raw response! Initializing blinkpy...")
                     # Login worked! Now we can initialize blinkpy
-                    blink = Blink(session=ClientSession())
-                    auth = Auth({"username": username, "password": password}, no_prompt=True)
-                    blink.auth = auth
+                    blink = new_blink(username, password)
                     # We can inject the token if we parsed it, but let's just let blink.start() do it
                     # assuming it will work now that we know credentials are good.
                     # But if blink.start() was failing before, maybe we should use the token?
@@ -533,11 +981,13 @@ async def login():
                     if not blink.cameras:
                          # If still no cameras, maybe we need to use the token we got?
                          add_log("Still no cameras after blink.start(). This is weird.")
+                         await blink.auth.session.close()
                          return jsonify({'error': 'Login succeeded but no cameras found'}), 500
                          
                     # Store the blink instance
-                    key = f"{username}:{password}"
-                    blink_instances[key] = blink
+                    await store_blink(key, blink)
+                    index_cameras(key, blink)
+                    mark_ready()
                     
                     session['username'] = username
                     session['password'] = password
@@ -548,7 +998,6 @@ async def login():
                     return jsonify({'error': f'Login failed: {status} - {text}'}), status
 
     except Exception as e:
-        import traceback
         traceback.print_exc()
         logging.error(f'Login failed: {e}')
         return jsonify({'error': f'Login failed: {str(e)}'}), 401
@@ -568,19 +1017,17 @@ async def login():
         blink_instances[key] = blink
         return jsonify({'status': '2fa_required'})
     except Exception as e:
-        import traceback
         traceback.print_exc()
         logging.error(f'Login failed: {e}')
         return jsonify({'error': f'Login failed: {str(e)}'}), 401
 
 @app.route('/api/verify-pin', methods=['POST'])
-@async_route
 async def verify_pin():
-    import logging
-    data = request.get_json()
+    data = (await request.get_json(silent=True)) or {}
     pin = data.get('pin')
-    username = os.getenv('BLINK_USERNAME')
-    password = os.getenv('BLINK_PASSWORD')
+    config = config_store.current
+    username = config.blink_username
+    password = config.blink_password
     
     if not pin or not username or not password:
         return jsonify({'error': 'Missing PIN or credentials'}), 400
@@ -592,11 +1039,6 @@ async def verify_pin():
     try:
         blink = blink_instances[key]
         
-        # Refresh session for the new event loop
-        new_session = ClientSession()
-        blink.session = new_session
-        blink.auth.session = new_session
-        
         # Send the PIN to Blink
         add_log(f'Sending 2FA code: {pin}')
         logging.info(f'Sending 2FA code: {pin}')
@@ -619,24 +1061,45 @@ async def verify_pin():
              logging.error('No cameras after 2FA verification')
              return jsonify({'error': 'Verification succeeded but no cameras found'}), 401
         
+        index_cameras(key, blink)
+        pending_pins.pop(key, None)
+        mark_ready()
         session['username'] = username
         session['password'] = password
         add_log(f'PIN verification successful! {len(blink.cameras)} cameras found')
         return jsonify({'status': 'success', 'cameras': len(blink.cameras)})
     except Exception as e:
-        import traceback
         traceback.print_exc()
         logging.error(f'PIN verification failed: {e}')
         return jsonify({'error': f'PIN verification failed: {str(e)}'}), 500
 
 
+@app.route('/api/health/live', methods=['GET'])
+async def health_live():
+    """Liveness: the process is up and serving requests"""
+    return jsonify({'status': 'alive', 'uptime': round(time.time() - warm_state['started_at'], 1)})
+
+@app.route('/api/health/ready', methods=['GET'])
+async def health_ready():
+    """Readiness: warm-up has finished or given up. A failed warm-up is still
+    ready, only cold, so a bad login does not take the server out of rotation"""
+    ready = warm_state['status'] in ('ready', 'needs_2fa', 'failed')
+    body = {
+        'ready': ready,
+        'warm': warm_state['status'] == 'ready',
+        'status': warm_state['status'],
+        'error': warm_state['error'],
+        'warm_up_seconds': round(warm_state['ready_at'] - warm_state['started_at'], 2) if warm_state['ready_at'] else None,
+    }
+    return jsonify(body), 200 if ready else 503
+
 @app.route('/api/logs', methods=['GET'])
-def get_logs():
+async def get_logs():
     """Return recent logs for display"""
     return jsonify({'logs': recent_logs})
 
 @app.route('/api/logout', methods=['POST'])
-def logout():
+async def logout():
     username = session.get('username')
     password = session.get('password')
     
@@ -645,8 +1108,10 @@ def logout():
         key = f"{username}:{password}"
         if key in blink_instances:
             # Close the session
-            asyncio.run(blink_instances[key].session.close())
+            await blink_instances[key].auth.session.close()
             del blink_instances[key]
+        camera_indexes.pop(key, None)
+        forget_responses(key)
     
     session.pop('username', None)
     session.pop('password', None)
@@ -0,0 +1,379 @@
+"""Background local archive of motion clips"""
+import asyncio
+import hashlib
+import json
+import os
+import random
+import shutil
+import threading
+import time
+
+from analytics import parse_timestamp
+
+MB = 1024 * 1024
+CHUNK_SIZE = 64 * 1024
+MAX_ATTEMPTS = 5
+
+# Seconds to wait for credentials when no account is logged in yet
+CREDENTIALS_POLL = 10
+
+# 'evicted' and 'failed' entries are only kept to stop re-downloads of
+# events Blink still returns, so they are dropped once older than this or
+# beyond this many, oldest first
+TOMBSTONE_MAX_AGE = 90 * 86400
+MAX_TOMBSTONES = 10000
+
+
+class ClipArchive:
+    """Downloads event clips into content-addressed storage under a size budget.
+
+    Layout under `directory`:
+        index.json           clip metadata, including queued downloads
+        partial/<id>.part    in-progress downloads, resumed with Range requests
+        objects/ab/<sha256>  clip bodies, shared by identical clips
+
+    `credentials` is a callable returning (base_url, headers) for the logged-in
+    account, or None when nobody is logged in. Clips evicted for space stay in
+    the index as 'evicted' so later event fetches do not download them again.
+
+    The lock only guards the in-memory index; index.json is written by
+    _flush() after it is released, so enqueue(), flag() and the download
+    workers never hold it across file writes. Callers on an event loop
+    should run enqueue() and flag() in a thread.
+    """
+
+    def __init__(self, directory, credentials, budget_bytes, max_age_days=None,
+                 camera_quota_bytes=None, concurrency=2, log=print):
+        self.directory = directory
+        self.credentials = credentials
+        self.budget_bytes = budget_bytes
+        self.max_age = max_age_days * 86400 if max_age_days else None
+        self.camera_quota_bytes = camera_quota_bytes
+        self.concurrency = concurrency
+        self.log = log
+        self._clips = {}
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._version = 0
+        self._saved_version = 0
+        self._loop = None
+        self._queue = None
+        self._load()
+
+    # -- index ---------------------------------------------------------------
+
+    @property
+    def _index_path(self):
+        return os.path.join(self.directory, 'index.json')
+
+    def _load(self):
+        try:
+            with open(self._index_path) as f:
+                self._clips = json.load(f)['clips']
+        except FileNotFoundError:
+            pass
+        except (ValueError, KeyError) as e:
+            self.log(f'Clip archive index unreadable, starting empty: {e}')
+
+    def _changed_locked(self):
+        """Mark the index as changed; call _flush() once the lock is released"""
+        self._version += 1
+
+    def _flush(self):
+        """Write index.json if it changed, holding the index lock only to serialize it"""
+        with self._save_lock:
+            with self._lock:
+                if self._version == self._saved_version:
+                    return
+                version = self._version
+                data = json.dumps({'clips': self._clips})
+            os.makedirs(self.directory, exist_ok=True)
+            tmp_path = f'{self._index_path}.tmp'
+            with open(tmp_path, 'w') as f:
+                f.write(data)
+            os.replace(tmp_path, self._index_path)
+            self._saved_version = version
+
+    def _object_path(self, digest):
+        return os.path.join(self.directory, 'objects', digest[:2], digest)
+
+    def _partial_path(self, clip_id):
+        safe = ''.join(c if c.isalnum() or c in '-_' else '_' for c in clip_id)
+        return os.path.join(self.directory, 'partial', f'{safe}.part')
+
+    # -- public API ----------------------------------------------------------
+
+    def start(self):
+        """Start the download workers on a background thread"""
+        if self._loop is not None:
+            return
+        self._loop = asyncio.new_event_loop()
+        self._queue = asyncio.Queue()
+        with self._lock:
+            self._prune_tombstones_locked()
+            pending = [clip_id for clip_id, clip in self._clips.items() if clip['status'] == 'pending']
+        self._flush()
+        for clip_id in pending:
+            self._queue.put_nowait(clip_id)
+        if pending:
+            self.log(f'Resuming {len(pending)} clip downloads')
+        threading.Thread(target=self._loop.run_until_complete, args=(self._main(),),
+                         name='clip-archive', daemon=True).start()
+
+    def enqueue(self, events):
+        """Queue clips for events not archived yet; returns how many were added"""
+        new_ids = []
+        cutoff = time.time() - self.max_age if self.max_age else None
+        with self._lock:
+            for event in events:
+                clip_id = event.get('id')
+                media = event.get('video_url')
+                if clip_id is None or not media or str(clip_id) in self._clips:
+                    continue
+                if cutoff and (parse_timestamp(event.get('timestamp')) or time.time()) < cutoff:
+                    continue
+                clip_id = str(clip_id)
+                self._clips[clip_id] = {
+                    'camera': event.get('camera', 'Unknown'),
+                    'timestamp': event.get('timestamp'),
+                    'media': media,
+                    'status': 'pending',
+                    'attempts': 0,
+                    'flagged': False,
+                }
+                new_ids.append(clip_id)
+            if new_ids:
+                self._changed_locked()
+        self._flush()
+        if self._loop is not None:
+            for clip_id in new_ids:
+                self._loop.call_soon_threadsafe(self._queue.put_nowait, clip_id)
+        return len(new_ids)
+
+    def flag(self, clip_id, keep=True):
+        """Mark a clip as exempt from retention (or clear the mark)"""
+        with self._lock:
+            clip = self._clips.get(str(clip_id))
+            if clip is None or clip['status'] == 'evicted':
+                return False
+            clip['flagged'] = bool(keep)
+            self._changed_locked()
+        self._flush()
+        return True
+
+    def path_for(self, clip_id):
+        """Return the local file for an archived clip, or None"""
+        with self._lock:
+            clip = self._clips.get(str(clip_id))
+            if clip is None or clip['status'] != 'done':
+                return None
+            return self._object_path(clip['sha256'])
+
+    def status(self):
+        with self._lock:
+            counts = {}
+            for clip in self._clips.values():
+                counts[clip['status']] = counts.get(clip['status'], 0) + 1
+            return {
+                'clips': counts,
+                'used_bytes': self._used_bytes_locked(),
+                'budget_bytes': self.budget_bytes,
+                'flagged': sum(1 for clip in self._clips.values() if clip['flagged']),
+            }
+
+    # -- downloads -----------------------------------------------------------
+
+    async def _main(self):
+        # Imported here so loading this module does not pull in aiohttp
+        from aiohttp import ClientSession, ClientTimeout
+        async with ClientSession(timeout=ClientTimeout(total=None, sock_read=60)) as http:
+            await asyncio.gather(*(self._worker(http) for _ in range(self.concurrency)))
+
+    async def _worker(self, http):
+        while True:
+            clip_id = await self._queue.get()
+            try:
+                await self._download(http, clip_id)
+            except Exception as e:
+                self.log(f'Clip archive worker error for {clip_id}: {e}')
+            finally:
+                self._queue.task_done()
+
+    async def _download(self, http, clip_id):
+        from aiohttp import ClientError
+        with self._lock:
+            clip = self._clips.get(clip_id)
+            if clip is None or clip['status'] != 'pending':
+                return
+            media = clip['media']
+
+        creds = self.credentials()
+        while creds is None:
+            await asyncio.sleep(CREDENTIALS_POLL)
+            creds = self.credentials()
+        base_url, headers = creds
+        url = media if media.startswith('http') else f'{base_url}{media}'
+
+        partial = self._partial_path(clip_id)
+        os.makedirs(os.path.dirname(partial), exist_ok=True)
+        offset = os.path.getsize(partial) if os.path.exists(partial) else 0
+        headers = dict(headers or {})
+        if offset:
+            headers['Range'] = f'bytes={offset}-'
+
+        try:
+            async with http.get(url, headers=headers) as response:
+                if response.status == 416:
+                    # Partial file already holds the whole clip
+                    pass
+                elif response.status not in (200, 206):
+                    raise ClientError(f'HTTP {response.status}')
+                else:
+                    mode = 'ab' if response.status == 206 else 'wb'
+                    with open(partial, mode) as f:
+                        async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                            f.write(chunk)
+        except (ClientError, asyncio.TimeoutError, OSError) as e:
+            await self._retry(clip_id, e)
+            return
+
+        # Hash, then move into the object store unless an identical clip exists
+        digest = await asyncio.to_thread(self._hash_file, partial)
+        size = os.path.getsize(partial)
+        target = self._object_path(digest)
+        if os.path.exists(target):
+            os.remove(partial)
+        else:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.move(partial, target)
+
+        with self._lock:
+            clip = self._clips.get(clip_id)
+            if clip is not None:
+                clip.update(status='done', sha256=digest, size=size, archived_at=time.time())
+            self._enforce_retention_locked()
+            self._changed_locked()
+        await asyncio.to_thread(self._flush)
+
+    async def _retry(self, clip_id, error):
+        with self._lock:
+            clip = self._clips.get(clip_id)
+            if clip is None:
+                return
+            clip['attempts'] += 1
+            attempts = clip['attempts']
+            if attempts >= MAX_ATTEMPTS:
+                clip['status'] = 'failed'
+                clip['failed_at'] = time.time()
+            self._changed_locked()
+        await asyncio.to_thread(self._flush)
+        if attempts >= MAX_ATTEMPTS:
+            self.log(f'Giving up on clip {clip_id}: {error}')
+            return
+        delay = min(300, 2 ** attempts) * random.uniform(0.5, 1.5)
+        self._loop.call_later(delay, self._queue.put_nowait, clip_id)
+
+    @staticmethod
+    def _hash_file(path):
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    # -- retention -----------------------------------------------------------
+
+    def _used_bytes_locked(self):
+        objects = {clip['sha256']: clip['size'] for clip in self._clips.values() if clip['status'] == 'done'}
+        return sum(objects.values())
+
+    def _prune_tombstones_locked(self):
+        """Drop old 'evicted' and 'failed' entries, whatever the clip age limit"""
+        cutoff = time.time() - TOMBSTONE_MAX_AGE
+        tombstones = sorted(
+            (self._clip_time(clip), clip_id) for clip_id, clip in self._clips.items()
+            if clip['status'] in ('evicted', 'failed')
+        )
+        excess = len(tombstones) - MAX_TOMBSTONES
+        for i, (ts, clip_id) in enumerate(tombstones):
+            if i >= excess and ts >= cutoff:
+                break
+            del self._clips[clip_id]
+            self._changed_locked()
+
+    def _clip_time(self, clip):
+        return (parse_timestamp(clip.get('timestamp')) or clip.get('archived_at')
+                or clip.get('evicted_at') or clip.get('failed_at', 0))
+
+    def _remove_locked(self, clip_id, tombstone=True):
+        """Delete a clip's file; keep a tombstone unless enqueue's age cutoff covers it"""
+        clip = self._clips.pop(clip_id)
+        if tombstone:
+            self._clips[clip_id] = {
+                'camera': clip['camera'],
+                'timestamp': clip.get('timestamp'),
+                'status': 'evicted',
+                'flagged': False,
+                'evicted_at': time.time(),
+            }
+        digest = clip.get('sha256')
+        if digest and not any(other.get('sha256') == digest for other in self._clips.values()):
+            try:
+                os.remove(self._object_path(digest))
+            except FileNotFoundError:
+                pass
+
+    def _enforce_retention_locked(self):
+        """Drop unflagged clips by age, then per-camera quota, then total budget"""
+        done = sorted(
+            ((self._clip_time(clip), clip_id) for clip_id, clip in self._clips.items()
+             if clip['status'] == 'done' and not clip['flagged']),
+        )
+        removed = set()
+
+        if self.max_age:
+            cutoff = time.time() - self.max_age
+            for ts, clip_id in done:
+                if ts < cutoff:
+                    self._remove_locked(clip_id, tombstone=False)
+                    removed.add(clip_id)
+            # Past the cutoff enqueue skips the event anyway
+            for clip_id, clip in list(self._clips.items()):
+                if clip['status'] == 'evicted' and self._clip_time(clip) < cutoff:
+                    del self._clips[clip_id]
+
+        if self.camera_quota_bytes:
+            per_camera = {}
+            for clip_id, clip in self._clips.items():
+                if clip['status'] == 'done' and clip_id not in removed:
+                    per_camera[clip['camera']] = per_camera.get(clip['camera'], 0) + clip['size']
+            for ts, clip_id in done:
+                clip = self._clips[clip_id]
+                if clip_id not in removed and per_camera[clip['camera']] > self.camera_quota_bytes:
+                    per_camera[clip['camera']] -= clip['size']
+                    self._remove_locked(clip_id)
+                    removed.add(clip_id)
+
+        if self.budget_bytes:
+            refs = {}
+            sizes = {}
+            for clip in self._clips.values():
+                if clip['status'] == 'done':
+                    refs[clip['sha256']] = refs.get(clip['sha256'], 0) + 1
+                    sizes[clip['sha256']] = clip['size']
+            used = sum(sizes.values())
+            for ts, clip_id in done:
+                if used <= self.budget_bytes:
+                    break
+                if clip_id in removed:
+                    continue
+                digest = self._clips[clip_id]['sha256']
+                refs[digest] -= 1
+                if not refs[digest]:
+                    used -= sizes[digest]
+                self._remove_locked(clip_id)
+                removed.add(clip_id)
+
+        self._prune_tombstones_locked()
+        if removed:
+            self.log(f'Clip archive retention removed {len(removed)} clips')
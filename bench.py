@@ -0,0 +1,168 @@
+"""Concurrency benchmark for the backend served by Hypercorn.
+
+Starts `hypercorn app:app` on one process in a scratch directory, with a
+locally archived clip so no Blink account is needed, then holds `--streams`
+slow downloads of that clip open while `--connections` clients send
+requests in a loop. Prints throughput, request latency while the streams
+are open and any failures.
+
+    .venv/bin/python bench.py --connections 400 --streams 200
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import secrets
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from aiohttp import ClientSession, ClientTimeout, TCPConnector
+
+CLIP_ID = 'bench'
+CHUNK = 64 * 1024
+
+
+def seed_archive(directory, clip_mb):
+    """Write one clip and an index entry the way the archive stores them"""
+    body = os.urandom(clip_mb * 1024 * 1024)
+    digest = hashlib.sha256(body).hexdigest()
+    object_dir = os.path.join(directory, 'objects', digest[:2])
+    os.makedirs(object_dir)
+    with open(os.path.join(object_dir, digest), 'wb') as f:
+        f.write(body)
+    clip = {'camera': 'Bench', 'timestamp': None, 'status': 'done', 'flagged': True,
+            'sha256': digest, 'size': len(body)}
+    with open(os.path.join(directory, 'index.json'), 'w') as f:
+        json.dump({'clips': {CLIP_ID: clip}}, f)
+
+
+def session_cookie(secret_key):
+    """Sign a logged-in session the way the app's session interface does"""
+    from quart import Quart
+    signer = Quart(__name__)
+    signer.secret_key = secret_key
+    return signer.session_interface.get_signing_serializer(signer).dumps(
+        {'username': 'bench@example.com', 'password': 'bench'})
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+async def wait_until_up(http, base_url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            async with http.get(f'{base_url}/api/health/live') as response:
+                if response.status == 200:
+                    return
+        except OSError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError('server did not start')
+
+
+async def stream(http, base_url, cookie, seconds, clip_bytes, results):
+    """Download the clip at a rate that spreads it over `seconds`"""
+    delay = seconds / max(clip_bytes // CHUNK, 1)
+    try:
+        async with http.get(f'{base_url}/api/archive/{CLIP_ID}', cookies={'session': cookie}) as response:
+            if response.status != 200:
+                results['stream_errors'].append(f'HTTP {response.status}')
+                return
+            received = 0
+            async for chunk in response.content.iter_chunked(CHUNK):
+                received += len(chunk)
+                await asyncio.sleep(delay)
+        if received != clip_bytes:
+            results['stream_errors'].append(f'short read {received}')
+        else:
+            results['streams_completed'] += 1
+    except Exception as e:
+        results['stream_errors'].append(repr(e))
+
+
+async def client(http, base_url, stop_at, results):
+    """Send requests back to back until `stop_at`"""
+    while time.monotonic() < stop_at:
+        started = time.monotonic()
+        try:
+            async with http.get(f'{base_url}/api/health/live') as response:
+                await response.read()
+                if response.status != 200:
+                    results['request_errors'].append(f'HTTP {response.status}')
+                    continue
+        except Exception as e:
+            results['request_errors'].append(repr(e))
+            continue
+        results['latencies'].append(time.monotonic() - started)
+
+
+def percentile(values, fraction):
+    return round(values[min(int(len(values) * fraction), len(values) - 1)] * 1000, 1) if values else None
+
+
+async def run(args, base_url, cookie, clip_bytes):
+    results = {'latencies': [], 'request_errors': [], 'streams_completed': 0, 'stream_errors': []}
+    # One TCP connection per client, none shared, no pool limit
+    connector = TCPConnector(limit=0, force_close=False)
+    async with ClientSession(connector=connector, timeout=ClientTimeout(total=args.seconds * 4)) as http:
+        await wait_until_up(http, base_url)
+        streams = [asyncio.create_task(stream(http, base_url, cookie, args.seconds, clip_bytes, results))
+                   for _ in range(args.streams)]
+        # Let the streams open before measuring
+        await asyncio.sleep(1)
+        started = time.monotonic()
+        await asyncio.gather(*(client(http, base_url, started + args.seconds - 2, results)
+                               for _ in range(args.connections)))
+        elapsed = time.monotonic() - started
+        await asyncio.gather(*streams)
+    latencies = sorted(results['latencies'])
+    return {
+        'connections': args.connections,
+        'streams': args.streams,
+        'requests': len(latencies),
+        'requests_per_second': round(len(latencies) / elapsed, 1),
+        'latency_ms': {'p50': percentile(latencies, 0.5), 'p95': percentile(latencies, 0.95),
+                       'p99': percentile(latencies, 0.99), 'max': percentile(latencies, 1)},
+        'request_errors': len(results['request_errors']),
+        'streams_completed': results['streams_completed'],
+        'stream_errors': results['stream_errors'][:10],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--connections', type=int, default=400, help='clients sending requests in a loop')
+    parser.add_argument('--streams', type=int, default=200, help='slow clip downloads held open')
+    parser.add_argument('--seconds', type=int, default=20, help='how long each stream stays open')
+    parser.add_argument('--clip-mb', type=int, default=4, help='size of the streamed clip')
+    args = parser.parse_args()
+
+    secret_key = secrets.token_hex(16)
+    port = free_port()
+    repo = os.path.dirname(os.path.abspath(__file__))
+    with tempfile.TemporaryDirectory() as workdir:
+        seed_archive(os.path.join(workdir, 'data', 'archive'), args.clip_mb)
+        env = dict(os.environ, PYTHONPATH=repo, FLASK_SECRET_KEY=secret_key, WARM_START='false',
+                   SYNC_INTERVAL_SECONDS='0', ARCHIVE_ENABLED='false', WEBHOOK_URLS='')
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'hypercorn', 'app:app', '--bind', f'127.0.0.1:{port}', '--workers', '1'],
+            cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            report = asyncio.run(run(args, f'http://127.0.0.1:{port}', session_cookie(secret_key),
+                                     args.clip_mb * 1024 * 1024))
+        finally:
+            server.terminate()
+            server.wait()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
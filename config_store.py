@@ -0,0 +1,137 @@
+"""Cached, atomically persisted configuration backed by the .env file"""
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import namedtuple
+
+from dotenv import dotenv_values
+
+Settings = namedtuple('Settings', ['blink_username', 'blink_password', 'masked_username', 'values'])
+
+# Values that dotenv would misread unless quoted
+_NEEDS_QUOTES = re.compile(r'[\s#"\'$\\]')
+
+# Read from the store only, never copied into os.environ
+CREDENTIAL_KEYS = ('BLINK_USERNAME', 'BLINK_PASSWORD')
+
+
+def mask_username(username):
+    if not username:
+        return None
+    parts = username.split('@')
+    if len(parts) == 2:
+        return f"{parts[0][:1]}***@{parts[1]}"
+    return f"{username[:1]}***"
+
+
+def _format_value(value):
+    if not _NEEDS_QUOTES.search(value):
+        return value
+    if "'" not in value:
+        return f"'{value}'"
+    escaped = value.replace('\\', '\\\\').replace('"', '\\"')
+    return f'"{escaped}"'
+
+
+class ConfigStore:
+    """Immutable settings snapshot, swapped whole on every change.
+
+    Readers just take `store.current`, which is a single attribute read with
+    no lock. Writers serialize on a lock, rewrite the file via a temporary
+    file and rename, then publish a new snapshot. A watcher thread reloads the
+    snapshot when the file is edited by hand.
+    """
+
+    def __init__(self, path='.env'):
+        self.path = path
+        self._write_lock = threading.Lock()
+        self._mtime = None
+        # Credentials the process was started with, used when the file has none
+        self._environ = {key: os.environ.get(key) for key in CREDENTIAL_KEYS}
+        self.current = self._read()
+
+    def _stat_mtime(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _read(self):
+        self._mtime = self._stat_mtime()
+        values = dotenv_values(self.path) if self._mtime is not None else {}
+        # Values in the file win; the process environment fills the gaps
+        username = values.get('BLINK_USERNAME') or self._environ['BLINK_USERNAME']
+        password = values.get('BLINK_PASSWORD') or self._environ['BLINK_PASSWORD']
+        return Settings(username, password, mask_username(username), values)
+
+    def export_environ(self):
+        """Copy the file's other settings into os.environ, like load_dotenv().
+
+        Credentials are left out so that removing them from the file takes
+        effect instead of a stale copy in the environment winning.
+        """
+        for key, value in self.current.values.items():
+            if key not in CREDENTIAL_KEYS and value is not None:
+                os.environ.setdefault(key, value)
+
+    def reload(self):
+        """Re-read the file if it changed on disk; returns True if it did"""
+        with self._write_lock:
+            if self._stat_mtime() == self._mtime:
+                return False
+            self.current = self._read()
+            return True
+
+    def update(self, **changes):
+        """Set keys in the file in one atomic rewrite and publish the result"""
+        with self._write_lock:
+            lines = []
+            if os.path.exists(self.path):
+                with open(self.path) as f:
+                    lines = f.readlines()
+
+            remaining = dict(changes)
+            new_lines = []
+            for line in lines:
+                key = line.split('=', 1)[0].strip()
+                if key.startswith('export '):
+                    key = key[len('export '):].strip()
+                if '=' in line and key in remaining:
+                    new_lines.append(f"{key}={_format_value(remaining.pop(key))}\n")
+                else:
+                    new_lines.append(line)
+            if remaining and new_lines and not new_lines[-1].endswith('\n'):
+                new_lines.append('\n')
+            for key, value in remaining.items():
+                new_lines.append(f"{key}={_format_value(value)}\n")
+
+            directory = os.path.dirname(os.path.abspath(self.path))
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.env.', suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w') as f:
+                    f.writelines(new_lines)
+                    f.flush()
+                    os.fsync(f.fileno())
+                if os.path.exists(self.path):
+                    os.chmod(tmp_path, os.stat(self.path).st_mode & 0o777)
+                os.replace(tmp_path, self.path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+            self.current = self._read()
+            return self.current
+
+    def watch(self, interval=2.0, log=print):
+        """Poll the file for changes on a daemon thread"""
+        def run():
+            while True:
+                time.sleep(interval)
+                try:
+                    if self.reload():
+                        log(f'Configuration reloaded from {self.path}')
+                except OSError as e:
+                    log(f'Could not reload {self.path}: {e}')
+        threading.Thread(target=run, name='config-watch', daemon=True).start()
@@ -0,0 +1,153 @@
+"""Streaming ZIP export of event clips and thumbnails"""
+import asyncio
+import datetime
+import io
+import json
+import re
+import zipfile
+from collections import deque
+
+READ_CHUNK = 1024 * 1024
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only, unseekable buffer that zipfile writes into and we drain"""
+
+    def __init__(self):
+        super().__init__()
+        self._buffer = bytearray()
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._buffer += data
+        return len(data)
+
+    def drain(self):
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+
+def _safe(value):
+    # Stripping dots too keeps names like '..' from escaping the archive root
+    return re.sub(r'[^A-Za-z0-9_.-]+', '_', str(value)).strip('_.') or 'unknown'
+
+
+def entry_name(event, extension):
+    return f"{_safe(event.get('camera'))}/{_safe(event.get('timestamp'))}_{_safe(event.get('id'))}.{extension}"
+
+
+async def stream_zip(events, fetch, local_clip, manifest_info, concurrency=4):
+    """Yield a ZIP of each event's clip and thumbnail, then manifest.json.
+
+    events is an async iterator of event dicts (as returned by /api/events).
+    fetch(url) returns the media bytes or None; local_clip(event_id) returns
+    a local file path or None. Up to `concurrency` events are fetched ahead
+    of the one being written, so memory stays bounded by that window no
+    matter how many events are exported.
+
+    Failures are recorded in the manifest instead of ending the stream, so
+    the client always gets a complete ZIP: per event as 'error', and for
+    the event source as a top-level 'error' with 'truncated' set.
+    """
+    sink = _ChunkSink()
+    archive = zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_STORED, allowZip64=True)
+    manifest = []
+
+    async def load(event):
+        path = local_clip(event.get('id'))
+        clip = path
+        if path is None and event.get('video_url'):
+            clip = asyncio.create_task(fetch(event['video_url']))
+        thumbnail = await fetch(event['thumbnail']) if event.get('thumbnail') else None
+        if isinstance(clip, asyncio.Task):
+            clip = await clip
+        return clip, thumbnail
+
+    pending = deque()
+    iterator = events.__aiter__()
+    exhausted = False
+    try:
+        while True:
+            while not exhausted and len(pending) < concurrency:
+                try:
+                    event = await iterator.__anext__()
+                except StopAsyncIteration:
+                    exhausted = True
+                    break
+                except Exception as e:
+                    exhausted = True
+                    manifest_info.update(truncated=True, error=f'Listing events failed: {e}')
+                    break
+                pending.append((event, asyncio.create_task(load(event))))
+            if not pending:
+                break
+
+            event, task = pending.popleft()
+            entry = {
+                'id': event.get('id'),
+                'camera': event.get('camera'),
+                'timestamp': event.get('timestamp'),
+                'clip': None,
+                'thumbnail': None,
+                'source': None,
+            }
+            try:
+                clip, thumbnail = await task
+            except Exception as e:
+                entry['error'] = str(e)
+                clip, thumbnail = None, None
+
+            src = None
+            if isinstance(clip, str):
+                try:
+                    src = open(clip, 'rb')
+                except OSError as e:
+                    # Retention can remove the file after it was looked up,
+                    # so fall back to Blink's copy
+                    clip = None
+                    error = f'Archived clip unavailable: {e}'
+                    if event.get('video_url'):
+                        try:
+                            clip = await fetch(event['video_url'])
+                        except Exception as fetch_error:
+                            error = str(fetch_error)
+                    if clip is None:
+                        entry['error'] = error
+            if src is not None:
+                entry.update(clip=entry_name(event, 'mp4'), source='archive')
+                try:
+                    with src, archive.open(entry['clip'], 'w', force_zip64=True) as dest:
+                        while True:
+                            chunk = await asyncio.to_thread(src.read, READ_CHUNK)
+                            if not chunk:
+                                break
+                            dest.write(chunk)
+                            yield sink.drain()
+                except OSError as e:
+                    # The entry is closed with what was read so far
+                    entry['error'] = f'Archived clip unreadable: {e}'
+            elif clip is not None:
+                entry.update(clip=entry_name(event, 'mp4'), source='blink')
+                archive.writestr(entry['clip'], clip)
+            if thumbnail is not None:
+                entry['thumbnail'] = entry_name(event, 'jpg')
+                archive.writestr(entry['thumbnail'], thumbnail)
+            manifest.append(entry)
+            data = sink.drain()
+            if data:
+                yield data
+    finally:
+        # Stop prefetching if the client went away mid-download
+        for _, task in pending:
+            task.cancel()
+
+    archive.writestr('manifest.json', json.dumps({
+        **manifest_info,
+        'exported_at': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'events': manifest,
+    }, indent=2, default=str))
+    archive.close()
+    yield sink.drain()
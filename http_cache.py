@@ -0,0 +1,96 @@
+"""Conditional, compressed JSON responses for the API routes"""
+import gzip
+import hashlib
+import json
+import threading
+
+from quart import Response, request
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - falls back to the stdlib encoder
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - gzip only
+    brotli = None
+
+# Bodies smaller than this are not worth compressing
+COMPRESS_MIN_BYTES = 1024
+
+# Last encoded snapshot per cache key: (etag, body, {encoding: compressed body})
+_snapshots = {}
+_lock = threading.Lock()
+
+
+def dumps(data):
+    """Serialize data to UTF-8 JSON bytes, using orjson when available"""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, separators=(',', ':'), default=str).encode('utf-8')
+
+
+def _pick_encoding():
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+
+def _compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=5)
+    return gzip.compress(body, compresslevel=6)
+
+
+def _snapshot(cache_key, body):
+    """Return the (etag, compressed variants) for body, reusing the last snapshot if unchanged"""
+    etag = hashlib.blake2b(body, digest_size=16).hexdigest()
+    with _lock:
+        cached = _snapshots.get(cache_key)
+        if cached is not None and cached[0] == etag:
+            return etag, cached[2]
+        variants = {}
+        if cache_key is not None:
+            _snapshots[cache_key] = (etag, body, variants)
+        return etag, variants
+
+
+def json_response(data, status=200, cache_key=None):
+    """Build a JSON response with an ETag, honoring If-None-Match and Accept-Encoding.
+
+    cache_key identifies the snapshot (e.g. route plus account) so compressed
+    bodies are reused while the data stays the same.
+    """
+    body = dumps(data)
+    etag, variants = _snapshot(cache_key, body)
+
+    if status == 200 and request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        encoding = _pick_encoding() if len(body) >= COMPRESS_MIN_BYTES else None
+        if encoding:
+            compressed = variants.get(encoding)
+            if compressed is None:
+                compressed = _compress(body, encoding)
+                variants[encoding] = compressed
+            response = Response(compressed, status=status, mimetype='application/json')
+            response.headers['Content-Encoding'] = encoding
+        else:
+            response = Response(body, status=status, mimetype='application/json')
+
+    # Weak, since the identity, gzip and br bodies share it
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def forget(prefix):
+    """Drop cached snapshots whose key starts with prefix (e.g. on logout)"""
+    with _lock:
+        for key in [k for k in _snapshots if str(k).startswith(prefix)]:
+            del _snapshots[key]
@@ -0,0 +1,115 @@
+"""Per-client sliding-window rate limiting"""
+import math
+import threading
+import time
+from collections import OrderedDict
+
+
+class RateLimit:
+    """At most `limit` hits per `window` seconds.
+
+    With `lockout`, exceeding the limit blocks the key for that many seconds.
+    With per_client=False, all clients share one counter (e.g. to protect the
+    upstream Blink quota).
+    """
+
+    def __init__(self, name, limit, window, lockout=0, per_client=True, message='Too many requests'):
+        self.name = name
+        self.message = message
+        self.limit = limit
+        self.window = window
+        self.lockout = lockout
+        self.per_client = per_client
+
+
+class RateLimiter:
+    """Sliding-window counters: O(1) time and a fixed few numbers of state per key.
+
+    Each key keeps the hit count of the current fixed window and of the
+    previous one; the previous count is weighted by how much of it still
+    overlaps the sliding window. Keys live in an LRU capped at `max_keys`,
+    and keys idle for two windows are dropped as new ones arrive.
+    """
+
+    def __init__(self, max_keys=10000):
+        self.max_keys = max_keys
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, rule, client, now=None):
+        """Count a hit; return (allowed, retry_after_seconds)"""
+        rejected, retry_after = self.hit_all([rule], client, now)
+        return rejected is None, retry_after
+
+    def hit_all(self, rules, client, now=None):
+        """Count a hit against every rule only if all of them allow it.
+
+        Returns (None, 0) when allowed, else (rejecting rule, retry_after), so
+        a request refused by one rule does not use up the others' budgets.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            entries = [self._entry(rule, client, now) for rule in rules]
+            for rule, entry in zip(rules, entries):
+                retry_after = self._check(rule, entry, now)
+                if retry_after:
+                    return rule, retry_after
+            for entry in entries:
+                entry[1] += 1
+            return None, 0
+
+    def _entry(self, rule, client, now):
+        key = (rule.name, client if rule.per_client else None)
+        window_start = now - now % rule.window
+        entry = self._entries.get(key)
+        if entry is None:
+            # [window_start, current, previous, blocked_until, window]
+            entry = [window_start, 0, 0, 0.0, rule.window]
+            self._entries[key] = entry
+            self._evict(now)
+        else:
+            self._entries.move_to_end(key)
+
+        if entry[0] != window_start:
+            entry[2] = entry[1] if window_start - entry[0] == rule.window else 0
+            entry[1] = 0
+            entry[0] = window_start
+        return entry
+
+    def _check(self, rule, entry, now):
+        """Return 0 if one more hit fits, else the seconds to wait"""
+        if now < entry[3]:
+            return math.ceil(entry[3] - now)
+        elapsed = now - entry[0]
+        weight = (rule.window - elapsed) / rule.window
+        if entry[2] * weight + entry[1] < rule.limit:
+            return 0
+        if rule.lockout:
+            entry[3] = now + rule.lockout
+            return math.ceil(rule.lockout)
+        return self._retry_after(rule, entry, elapsed)
+
+    @staticmethod
+    def _retry_after(rule, entry, elapsed):
+        """Seconds until the weighted count drops below the limit"""
+        current, previous = entry[1], entry[2]
+        if current < rule.limit and previous:
+            # The previous window's share shrinks as the current one advances
+            needed = rule.window * (1 - (rule.limit - current) / previous)
+            return max(1, math.ceil(needed - elapsed))
+        # Wait for the next window, where this one's hits count as previous
+        needed = rule.window * (1 - rule.limit / current) if current else 0
+        return max(1, math.ceil(rule.window - elapsed + needed))
+
+    def _evict(self, now):
+        while len(self._entries) > self.max_keys:
+            self._entries.popitem(last=False)
+        # Drop a few idle keys from the cold end on each insert
+        for _ in range(2):
+            key, entry = next(iter(self._entries.items()))
+            if now - entry[0] < 2 * entry[4] or now < entry[3]:
+                break
+            del self._entries[key]
+
+    def __len__(self):
+        return len(self._entries)
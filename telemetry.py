@@ -0,0 +1,237 @@
+"""Per-camera telemetry time series with downsampled tiers"""
+import os
+import re
+import threading
+import time
+
+# numpy is imported where it is used, so loading the app does not pay for it
+# until the first sample is recorded or history is read
+
+METRICS = ('battery', 'battery_voltage', 'temperature', 'armed', 'motion')
+
+# Raw samples are only kept in memory
+RAW_CAPACITY = 2880
+
+# name -> (bucket seconds, buckets kept); these tiers are persisted
+TIERS = {
+    '1m': (60, 7 * 24 * 60),
+    '1h': (3600, 90 * 24),
+    '1d': (86400, 5 * 365),
+}
+
+# Longest range each resolution answers; anything longer falls through to 1d
+RAW_MAX_RANGE = 6 * 3600
+TIER_MAX_RANGE = {
+    '1m': 2 * 86400,
+    '1h': 90 * 86400,
+}
+
+# Columns of a downsampled row
+BUCKET, COUNT, SUM, MIN, MAX = range(5)
+
+SAVE_INTERVAL = 60
+
+_RANGE_UNITS = {'m': 60, 'h': 3600, 'd': 86400, 'w': 7 * 86400}
+
+
+def parse_range(value):
+    """Parse a range like '90m', '24h' or '7d' into seconds"""
+    match = re.fullmatch(r'(\d+)([mhdw])', (value or '').strip())
+    if not match:
+        raise ValueError(f"Invalid range '{value}', expected e.g. 6h, 7d")
+    return int(match.group(1)) * _RANGE_UNITS[match.group(2)]
+
+
+class RingBuffer:
+    """Fixed-capacity, array-backed buffer of rows in insertion (time) order"""
+
+    def __init__(self, capacity, width):
+        import numpy as np
+        self.data = np.zeros((capacity, width))
+        self.start = 0
+        self.size = 0
+
+    @property
+    def capacity(self):
+        return self.data.shape[0]
+
+    def last(self):
+        """Return the most recent row (a writable view), or None if empty"""
+        if not self.size:
+            return None
+        return self.data[(self.start + self.size - 1) % self.capacity]
+
+    def append(self, row):
+        if self.size < self.capacity:
+            self.data[(self.start + self.size) % self.capacity] = row
+            self.size += 1
+        else:
+            self.data[self.start] = row
+            self.start = (self.start + 1) % self.capacity
+
+    def ordered(self):
+        """Return all rows oldest first"""
+        end = self.start + self.size
+        if end <= self.capacity:
+            return self.data[self.start:end]
+        import numpy as np
+        return np.concatenate((self.data[self.start:], self.data[:end - self.capacity]))
+
+    def since(self, t):
+        """Return rows whose first column is >= t, located by binary search"""
+        import numpy as np
+        rows = self.ordered()
+        return rows[np.searchsorted(rows[:, 0], t, side='left'):]
+
+    def load(self, rows):
+        rows = rows[-self.capacity:]
+        self.data[:len(rows)] = rows
+        self.start = 0
+        self.size = len(rows)
+
+
+class Series:
+    """One camera metric: raw samples plus incrementally maintained tiers"""
+
+    def __init__(self):
+        self.raw = RingBuffer(RAW_CAPACITY, 2)
+        self.tiers = {name: RingBuffer(keep, 5) for name, (_, keep) in TIERS.items()}
+
+    def record(self, t, value):
+        last = self.raw.last()
+        if last is not None and t <= last[0]:
+            return False
+        self.raw.append((t, value))
+        for name, (step, _) in TIERS.items():
+            bucket = t - t % step
+            tier = self.tiers[name]
+            row = tier.last()
+            if row is not None and row[BUCKET] == bucket:
+                row[COUNT] += 1
+                row[SUM] += value
+                row[MIN] = min(row[MIN], value)
+                row[MAX] = max(row[MAX], value)
+            else:
+                tier.append((bucket, 1, value, value, value))
+        return True
+
+
+class TelemetryStore:
+    """Records camera telemetry and answers history queries at a fitting resolution"""
+
+    def __init__(self, directory, log=print):
+        self.directory = directory
+        self.log = log
+        self._series = {}
+        self._dirty = set()
+        self._last_save = 0
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def _path(self, camera):
+        safe = re.sub(r'[^A-Za-z0-9_.-]', '_', camera)
+        return os.path.join(self.directory, f'{safe}.npz')
+
+    def load(self):
+        """Load persisted tiers; called at warm-up or on first use"""
+        with self._lock:
+            self._load_locked()
+
+    def _load_locked(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        if not os.path.isdir(self.directory):
+            return
+        import numpy as np
+        for filename in os.listdir(self.directory):
+            if not filename.endswith('.npz'):
+                continue
+            try:
+                with np.load(os.path.join(self.directory, filename)) as saved:
+                    camera = str(saved['camera'])
+                    for key in saved.files:
+                        if key == 'camera':
+                            continue
+                        metric, tier = key.rsplit('.', 1)
+                        series = self._series.setdefault((camera, metric), Series())
+                        series.tiers[tier].load(saved[key])
+            except (OSError, KeyError, ValueError) as e:
+                self.log(f'Skipping unreadable telemetry file {filename}: {e}')
+
+    def record(self, camera, values, t=None):
+        """Record one refresh worth of metric values for a camera.
+
+        Non-numeric values are skipped; samples not newer than the last one
+        for that metric are ignored, so repeated cached reads are harmless.
+        """
+        t = float(t if t is not None else time.time())
+        with self._lock:
+            self._load_locked()
+            for metric, value in values.items():
+                if isinstance(value, bool):
+                    value = float(value)
+                if not isinstance(value, (int, float)):
+                    continue
+                series = self._series.setdefault((camera, metric), Series())
+                if series.record(t, float(value)):
+                    self._dirty.add(camera)
+            if self._dirty and time.time() - self._last_save >= SAVE_INTERVAL:
+                self._save_locked()
+
+    def history(self, camera, metric, seconds, now=None):
+        """Return (resolution, points) covering the last `seconds` of a metric.
+
+        Short ranges use raw samples unless the raw buffer, which is not
+        persisted, has lost part of the range (e.g. after a restart); then
+        the 1m tier answers instead.
+        """
+        import numpy as np
+        since = (now if now is not None else time.time()) - seconds
+        with self._lock:
+            self._load_locked()
+            series = self._series.get((camera, metric))
+            if seconds <= RAW_MAX_RANGE:
+                rows = series.raw.since(since) if series else np.empty((0, 2))
+                if not self._raw_missing_locked(series, since, rows):
+                    return 'raw', [{'t': t, 'value': v} for t, v in rows.tolist()]
+                resolution = '1m'
+            else:
+                resolution = next((name for name, limit in TIER_MAX_RANGE.items() if seconds <= limit), '1d')
+            rows = series.tiers[resolution].since(since - TIERS[resolution][0]) if series else np.empty((0, 5))
+        return resolution, [
+            {'t': row[BUCKET], 'value': row[SUM] / row[COUNT], 'min': row[MIN], 'max': row[MAX]}
+            for row in rows.tolist() if row[BUCKET] + TIERS[resolution][0] > since
+        ]
+
+    @staticmethod
+    def _raw_missing_locked(series, since, raw_rows):
+        """True if the 1m tier holds a bucket in range that ends before the first raw sample"""
+        if series is None:
+            return False
+        step = TIERS['1m'][0]
+        buckets = series.tiers['1m'].since(since - step)
+        buckets = buckets[buckets[:, BUCKET] + step > since]
+        first_raw = raw_rows[0, 0] if len(raw_rows) else float('inf')
+        return bool(len(buckets)) and buckets[0, BUCKET] + step <= first_raw
+
+    def save(self):
+        with self._lock:
+            self._save_locked()
+
+    def _save_locked(self):
+        import numpy as np
+        os.makedirs(self.directory, exist_ok=True)
+        for camera in self._dirty:
+            arrays = {'camera': np.array(camera)}
+            for (name, metric), series in self._series.items():
+                if name == camera:
+                    for tier, buffer in series.tiers.items():
+                        arrays[f'{metric}.{tier}'] = buffer.ordered()
+            path = self._path(camera)
+            tmp_path = f'{path}.tmp'
+            with open(tmp_path, 'wb') as f:
+                np.savez(f, **arrays)
+            os.replace(tmp_path, path)
+        self._dirty.clear()
+        self._last_save = time.time()
@@ -0,0 +1,93 @@
+import datetime
+
+import analytics
+from analytics import WINDOW_HOURS, ActivityStats, parse_timestamp
+
+HOUR = 3600
+NOW = 1_700_000_000 - 1_700_000_000 % HOUR + 1800
+
+
+def iso(ts):
+    return datetime.datetime.fromtimestamp(ts, datetime.timezone.utc).isoformat()
+
+
+def at(monkeypatch, ts):
+    monkeypatch.setattr(analytics.time, 'time', lambda: ts)
+
+
+def test_parse_timestamp():
+    assert parse_timestamp('2023-11-14T22:13:20Z') == 1_700_000_000
+    assert parse_timestamp('unknown') is None
+
+
+def test_ingest_skips_seen_events(monkeypatch):
+    at(monkeypatch, NOW)
+    stats = ActivityStats()
+    events = [{'id': 1, 'camera': 'Front', 'timestamp': iso(NOW - 60)}]
+    assert stats.ingest(events) == 1
+    assert stats.ingest(events) == 0
+    snapshot = stats.snapshot()
+    assert snapshot['cameras']['Front']['total'] == 1
+    assert sum(snapshot['by_hour']) == 1
+
+
+def test_rolling_totals_advance_with_time(monkeypatch):
+    at(monkeypatch, NOW)
+    stats = ActivityStats()
+    stats.ingest([
+        {'id': 1, 'camera': 'Front', 'timestamp': iso(NOW - 60)},
+        {'id': 2, 'camera': 'Front', 'timestamp': iso(NOW - 2 * 86400)},
+        {'id': 3, 'camera': 'Back', 'timestamp': iso(NOW - 8 * 86400)},
+    ])
+    snapshot = stats.snapshot()
+    assert (snapshot['last_24h'], snapshot['last_7d'], snapshot['total']) == (1, 2, 3)
+
+    at(monkeypatch, NOW + 86400)
+    snapshot = stats.snapshot()
+    assert (snapshot['last_24h'], snapshot['last_7d']) == (0, 2)
+
+    at(monkeypatch, NOW + 6 * 86400)
+    snapshot = stats.snapshot()
+    assert (snapshot['last_24h'], snapshot['last_7d'], snapshot['total']) == (0, 1, 3)
+
+    # Jumping past the whole window clears every slot
+    at(monkeypatch, NOW + (WINDOW_HOURS + 5) * HOUR)
+    snapshot = stats.snapshot()
+    assert (snapshot['last_7d'], snapshot['total']) == (0, 3)
+
+
+def test_newer_event_advances_window(monkeypatch):
+    at(monkeypatch, NOW)
+    stats = ActivityStats()
+    stats.ingest([{'id': 1, 'camera': 'Front', 'timestamp': iso(NOW - 7 * 86400 + HOUR)}])
+    # An event stamped ahead of the local clock moves the window on
+    stats.ingest([{'id': 2, 'camera': 'Front', 'timestamp': iso(NOW + 2 * HOUR)}])
+    assert stats.snapshot()['last_7d'] == 1
+
+
+def test_events_without_id_are_deduped_on_camera_and_time(monkeypatch):
+    at(monkeypatch, NOW)
+    stats = ActivityStats()
+    events = [{'camera': 'Front', 'timestamp': iso(NOW - 60)}, {'camera': 'Back', 'timestamp': iso(NOW - 60)}]
+    assert stats.ingest(events) == 2
+    assert stats.ingest(events) == 0
+
+
+def test_stats_survive_restart(monkeypatch, tmp_path):
+    path = str(tmp_path / 'activity.npz')
+    at(monkeypatch, NOW)
+    stats = ActivityStats(path)
+    events = [
+        {'id': 1, 'camera': 'Front', 'timestamp': iso(NOW - 60)},
+        {'id': 2, 'camera': 'Back', 'timestamp': iso(NOW - 2 * 86400)},
+    ]
+    stats.ingest(events)
+    stats.save()
+
+    at(monkeypatch, NOW + 86400)
+    restored = ActivityStats(path)
+    # Re-fetched events are still recognised after the restart
+    assert restored.ingest(events) == 0
+    snapshot = restored.snapshot()
+    assert (snapshot['last_24h'], snapshot['last_7d'], snapshot['total']) == (0, 2, 2)
+    assert set(snapshot['cameras']) == {'Front', 'Back'}
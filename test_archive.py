@@ -0,0 +1,142 @@
+import asyncio
+import datetime
+import os
+import time
+
+import archive as archive_module
+from archive import MB, ClipArchive
+
+NOW = time.time()
+
+
+class FakeResponse:
+    def __init__(self, body):
+        self.status = 200
+        self.body = body
+        self.content = self
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def iter_chunked(self, size):
+        for i in range(0, len(self.body), size):
+            yield self.body[i:i + size]
+
+
+class FakeHttp:
+    def __init__(self, bodies):
+        self.bodies = bodies
+        self.requested = []
+
+    def get(self, url, headers=None):
+        self.requested.append(url)
+        return FakeResponse(self.bodies[url])
+
+
+def event(clip_id, camera='Front', age=60):
+    timestamp = datetime.datetime.fromtimestamp(NOW - age, datetime.timezone.utc).isoformat()
+    return {'id': clip_id, 'camera': camera, 'timestamp': timestamp, 'video_url': f'/clip/{clip_id}.mp4'}
+
+
+def make_archive(tmp_path, **kwargs):
+    kwargs.setdefault('budget_bytes', 10 * MB)
+    return ClipArchive(str(tmp_path), lambda: ('https://blink', {}), log=lambda message: None, **kwargs)
+
+
+def download(archive, http, *clip_ids):
+    async def run():
+        for clip_id in clip_ids:
+            await archive._download(http, str(clip_id))
+    asyncio.run(run())
+
+
+def test_identical_clips_share_one_object(tmp_path):
+    archive = make_archive(tmp_path)
+    http = FakeHttp({
+        'https://blink/clip/1.mp4': b'same',
+        'https://blink/clip/2.mp4': b'same',
+        'https://blink/clip/3.mp4': b'different',
+    })
+    assert archive.enqueue([event(1), event(2), event(3)]) == 3
+    download(archive, http, 1, 2, 3)
+
+    assert archive.path_for(1) == archive.path_for(2) != archive.path_for(3)
+    assert open(archive.path_for(1), 'rb').read() == b'same'
+    assert archive.status()['used_bytes'] == len(b'same') + len(b'different')
+    assert not os.listdir(tmp_path / 'partial')
+
+
+def test_enqueue_skips_known_and_expired_events(tmp_path):
+    archive = make_archive(tmp_path, max_age_days=1)
+    assert archive.enqueue([event(1), event(2, age=2 * 86400), {'id': 3}]) == 1
+    assert archive.enqueue([event(1)]) == 0
+
+
+def test_budget_evicts_oldest_and_is_not_redownloaded(tmp_path):
+    archive = make_archive(tmp_path, budget_bytes=2 * MB)
+    events = [event(1, age=300), event(2, age=200), event(3, age=100)]
+    http = FakeHttp({f"https://blink{e['video_url']}": bytes([i]) * MB for i, e in enumerate(events)})
+    archive.enqueue(events)
+    download(archive, http, 1, 2, 3)
+
+    assert archive.path_for(1) is None
+    assert archive.path_for(2) and archive.path_for(3)
+    assert archive.status()['clips'] == {'evicted': 1, 'done': 2}
+    # The next /api/events poll still returns the evicted event
+    assert archive.enqueue(events) == 0
+
+    restored = make_archive(tmp_path, budget_bytes=2 * MB)
+    assert restored.enqueue(events) == 0
+
+
+def test_flagged_clips_survive_camera_quota(tmp_path):
+    archive = make_archive(tmp_path, camera_quota_bytes=MB)
+    events = [event(1, age=300), event(2, age=200), event(3, camera='Back', age=100)]
+    http = FakeHttp({f"https://blink{e['video_url']}": bytes([i]) * MB for i, e in enumerate(events)})
+    archive.enqueue(events)
+    download(archive, http, 1)
+    assert archive.flag(1)
+    download(archive, http, 2, 3)
+
+    # Front is over quota, but its only unflagged clip is the newer one
+    assert archive.path_for(1) is not None
+    assert archive.path_for(2) is None
+    assert archive.path_for(3) is not None
+    assert not archive.flag(2)
+
+
+def test_age_limit_drops_clips_and_tombstones(tmp_path):
+    archive = make_archive(tmp_path, max_age_days=1)
+    archive._clips['old'] = {'camera': 'Front', 'timestamp': None, 'status': 'evicted',
+                             'flagged': False, 'evicted_at': NOW - 2 * 86400}
+    http = FakeHttp({'https://blink/clip/1.mp4': b'clip'})
+    archive.enqueue([event(1)])
+    archive._clips['1']['timestamp'] = event(1, age=2 * 86400)['timestamp']
+    download(archive, http, 1)
+
+    assert archive._clips == {}
+
+
+def test_tombstones_are_pruned_without_an_age_limit(tmp_path, monkeypatch):
+    monkeypatch.setattr(archive_module, 'MAX_TOMBSTONES', 2)
+    archive = make_archive(tmp_path)
+    for i, status in enumerate(['evicted', 'failed', 'evicted', 'failed']):
+        archive._clips[f'old{i}'] = {'camera': 'Front', 'timestamp': event(i, age=1000 - i)['timestamp'],
+                                     'status': status, 'flagged': False}
+    archive._clips['ancient'] = {'camera': 'Front', 'timestamp': event(9, age=100 * 86400)['timestamp'],
+                                 'status': 'evicted', 'flagged': False}
+    with archive._lock:
+        archive._prune_tombstones_locked()
+    assert sorted(archive._clips) == ['old2', 'old3']
+
+
+def test_index_is_written_after_changes(tmp_path):
+    archive = make_archive(tmp_path)
+    archive.enqueue([event(1)])
+    archive.flag(1)
+    restored = make_archive(tmp_path)
+    assert restored._clips['1']['flagged'] is True
+    assert restored._clips['1']['status'] == 'pending'
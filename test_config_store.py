@@ -0,0 +1,94 @@
+import os
+
+import pytest
+from dotenv import dotenv_values
+
+import config_store
+from config_store import ConfigStore, mask_username
+
+
+@pytest.fixture(autouse=True)
+def clean_environ(monkeypatch):
+    for key in ('BLINK_USERNAME', 'BLINK_PASSWORD', 'EXTRA_SETTING'):
+        monkeypatch.delenv(key, raising=False)
+
+
+def test_mask_username():
+    assert mask_username('jane@example.com') == 'j***@example.com'
+    assert mask_username('jane') == 'j***'
+    assert mask_username(None) is None
+
+
+@pytest.mark.parametrize('value', [
+    'plain',
+    'with space',
+    'hash#tag',
+    "it's",
+    'dollar$HOME',
+    'quote"and\'both',
+    'back\\slash "quoted"',
+])
+def test_update_round_trips_through_dotenv(tmp_path, value):
+    path = tmp_path / '.env'
+    store = ConfigStore(str(path))
+    store.update(BLINK_PASSWORD=value)
+    assert dotenv_values(path)['BLINK_PASSWORD'] == value
+    assert ConfigStore(str(path)).current.blink_password == value
+
+
+def test_update_rewrites_keys_in_place(tmp_path):
+    path = tmp_path / '.env'
+    path.write_text('# account\nexport BLINK_USERNAME=old@example.com\nOTHER=1')
+    os.chmod(path, 0o600)
+    store = ConfigStore(str(path))
+
+    settings = store.update(BLINK_USERNAME='new@example.com', BLINK_PASSWORD='secret')
+    assert settings is store.current
+    assert settings.masked_username == 'n***@example.com'
+    assert path.read_text() == '# account\nBLINK_USERNAME=new@example.com\nOTHER=1\nBLINK_PASSWORD=secret\n'
+    assert os.stat(path).st_mode & 0o777 == 0o600
+    assert [name for name in os.listdir(tmp_path) if name != '.env'] == []
+
+
+def test_failed_write_leaves_file_untouched(tmp_path, monkeypatch):
+    path = tmp_path / '.env'
+    path.write_text('BLINK_USERNAME=old\n')
+    store = ConfigStore(str(path))
+
+    def fail(src, dst):
+        raise OSError('disk full')
+    monkeypatch.setattr(config_store.os, 'replace', fail)
+    with pytest.raises(OSError):
+        store.update(BLINK_USERNAME='new')
+    assert path.read_text() == 'BLINK_USERNAME=old\n'
+    assert store.current.blink_username == 'old'
+    assert os.listdir(tmp_path) == ['.env']
+
+
+def test_reload_picks_up_hand_edits(tmp_path):
+    path = tmp_path / '.env'
+    path.write_text('BLINK_USERNAME=first\n')
+    store = ConfigStore(str(path))
+    assert not store.reload()
+
+    path.write_text('BLINK_USERNAME=second\n')
+    os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 1))
+    assert store.reload()
+    assert store.current.blink_username == 'second'
+
+
+def test_removed_credentials_are_not_shadowed_by_environ(tmp_path, monkeypatch):
+    path = tmp_path / '.env'
+    path.write_text('BLINK_USERNAME=file-user\nEXTRA_SETTING=on\n')
+    monkeypatch.setenv('BLINK_PASSWORD', 'from-process')
+    store = ConfigStore(str(path))
+    store.export_environ()
+    assert os.environ['EXTRA_SETTING'] == 'on'
+    assert 'BLINK_USERNAME' not in os.environ
+
+    path.write_text('BLINK_USERNAME=\n')
+    os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 1))
+    store.reload()
+    assert store.current.blink_username is None
+    # Credentials the process started with still fill the gaps
+    assert store.current.blink_password == 'from-process'
@@ -0,0 +1,107 @@
+import asyncio
+import io
+import json
+import zipfile
+
+from export import entry_name, stream_zip
+
+
+async def iterate(events, manifest_info=None, truncate=False):
+    for event in events:
+        yield event
+    if truncate:
+        manifest_info['truncated'] = True
+
+
+def export(events, fetch, local_clip, manifest_info, **kwargs):
+    async def collect():
+        return [chunk async for chunk in stream_zip(events, fetch, local_clip, manifest_info, **kwargs)]
+    return asyncio.run(collect())
+
+
+def test_entry_name_is_path_safe():
+    event = {'camera': 'Front Door/..', 'timestamp': '2025-11-01T10:00:00+00:00', 'id': 7}
+    assert entry_name(event, 'mp4') == 'Front_Door/2025-11-01T10_00_00_00_00_7.mp4'
+    assert entry_name({'camera': '..', 'id': 1}, 'jpg') == 'unknown/None_1.jpg'
+
+
+def test_stream_is_a_valid_zip(tmp_path):
+    archived = tmp_path / 'clip.mp4'
+    archived.write_bytes(b'local clip' * 1000)
+    events = [
+        {'id': 1, 'camera': 'Front', 'timestamp': 't1', 'video_url': '/v/1', 'thumbnail': '/t/1'},
+        {'id': 2, 'camera': 'Back', 'timestamp': 't2', 'video_url': '/v/2', 'thumbnail': '/t/2'},
+        {'id': 3, 'camera': 'Back', 'timestamp': 't3', 'video_url': '/v/missing'},
+    ]
+    media = {'/v/2': b'remote clip', '/t/1': b'jpg1', '/t/2': b'jpg2'}
+
+    async def fetch(url):
+        return media.get(url)
+
+    manifest_info = {'from': 'a', 'to': 'b', 'truncated': False}
+    chunks = export(iterate(events, manifest_info, truncate=True), fetch,
+                    lambda clip_id: str(archived) if clip_id == 1 else None, manifest_info,
+                    concurrency=2)
+    assert len(chunks) > 1
+
+    with zipfile.ZipFile(io.BytesIO(b''.join(chunks))) as archive:
+        assert archive.testzip() is None
+        assert archive.read(entry_name(events[0], 'mp4')) == archived.read_bytes()
+        assert archive.read(entry_name(events[1], 'mp4')) == b'remote clip'
+        assert archive.read(entry_name(events[1], 'jpg')) == b'jpg2'
+        manifest = json.loads(archive.read('manifest.json'))
+
+    assert manifest['from'] == 'a'
+    # Set by the event source after the last event, before the manifest is written
+    assert manifest['truncated'] is True
+    assert [(e['id'], e['source']) for e in manifest['events']] == [(1, 'archive'), (2, 'blink'), (3, None)]
+    assert manifest['events'][2]['clip'] is None
+
+
+def test_failed_download_is_recorded_not_fatal():
+    async def fetch(url):
+        raise RuntimeError('upstream timeout')
+
+    chunks = export(iterate([{'id': 1, 'camera': 'Front', 'timestamp': 't', 'video_url': '/v/1'}]),
+                    fetch, lambda clip_id: None, {})
+    with zipfile.ZipFile(io.BytesIO(b''.join(chunks))) as archive:
+        manifest = json.loads(archive.read('manifest.json'))
+        assert archive.namelist() == ['manifest.json']
+    assert manifest['events'][0]['error'] == 'upstream timeout'
+
+
+def test_removed_archive_file_falls_back_to_blink(tmp_path):
+    async def fetch(url):
+        return {'/v/1': b'remote clip'}.get(url)
+
+    events = [
+        {'id': 1, 'camera': 'Front', 'timestamp': 't1', 'video_url': '/v/1'},
+        {'id': 2, 'camera': 'Front', 'timestamp': 't2'},
+    ]
+    # Retention removed both files after the archive lookup
+    chunks = export(iterate(events), fetch, lambda clip_id: str(tmp_path / f'{clip_id}.mp4'), {})
+    with zipfile.ZipFile(io.BytesIO(b''.join(chunks))) as archive:
+        assert archive.testzip() is None
+        assert archive.read(entry_name(events[0], 'mp4')) == b'remote clip'
+        manifest = json.loads(archive.read('manifest.json'))
+    first, second = manifest['events']
+    assert (first['source'], 'error' in first) == ('blink', False)
+    assert second['clip'] is None and 'Archived clip unavailable' in second['error']
+
+
+def test_failing_event_source_still_closes_the_zip():
+    async def events():
+        yield {'id': 1, 'camera': 'Front', 'timestamp': 't1', 'video_url': '/v/1'}
+        raise RuntimeError('Blink unavailable')
+
+    async def fetch(url):
+        return b'clip'
+
+    manifest_info = {'truncated': False}
+    chunks = export(events(), fetch, lambda clip_id: None, manifest_info)
+    with zipfile.ZipFile(io.BytesIO(b''.join(chunks))) as archive:
+        assert archive.testzip() is None
+        manifest = json.loads(archive.read('manifest.json'))
+    assert manifest['truncated'] is True
+    assert manifest['error'] == 'Listing events failed: Blink unavailable'
+    assert [e['id'] for e in manifest['events']] == [1]
@@ -0,0 +1,63 @@
+import asyncio
+import gzip
+
+from quart import Quart
+
+from http_cache import COMPRESS_MIN_BYTES, json_response
+
+app = Quart(__name__)
+
+
+@app.route('/small')
+async def small():
+    return json_response({'ok': True}, cache_key='test:small')
+
+
+@app.route('/large')
+async def large():
+    return json_response({'items': ['x' * 10] * COMPRESS_MIN_BYTES}, cache_key='test:large')
+
+
+def request(path, headers=None):
+    async def run():
+        response = await app.test_client().get(path, headers=headers or {})
+        return response, await response.get_data()
+    return asyncio.run(run())
+
+
+def test_matching_if_none_match_gets_304():
+    response, body = request('/small')
+    etag = response.headers['ETag']
+    assert etag.startswith('W/"')
+    assert body == b'{"ok":true}'
+
+    response, body = request('/small', {'If-None-Match': etag})
+    assert response.status_code == 304
+    assert body == b''
+    assert response.headers['ETag'] == etag
+
+    response, _ = request('/small', {'If-None-Match': 'W/"stale"'})
+    assert response.status_code == 200
+
+
+def test_small_bodies_are_not_compressed():
+    response, _ = request('/small', {'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in response.headers
+
+
+def test_large_bodies_are_compressed_with_a_weak_etag():
+    plain, plain_body = request('/large')
+    zipped, zipped_body = request('/large', {'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in plain.headers
+    assert zipped.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in zipped.headers['Vary']
+    assert gzip.decompress(zipped_body) == plain_body
+    assert len(zipped_body) < len(plain_body)
+    # Each coding is a different representation, so the shared tag is weak
+    assert zipped.headers['ETag'] == plain.headers['ETag']
+    assert zipped.headers['ETag'].startswith('W/')
+
+    brotli, _ = request('/large', {'Accept-Encoding': 'br, gzip'})
+    assert brotli.headers['Content-Encoding'] == 'br'
+    revalidated, _ = request('/large', {'Accept-Encoding': 'br', 'If-None-Match': plain.headers['ETag']})
+    assert revalidated.status_code == 304
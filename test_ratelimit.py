@@ -0,0 +1,73 @@
+from ratelimit import RateLimit, RateLimiter
+
+T0 = 1_080_000  # a multiple of every window below
+
+
+def test_allows_up_to_limit_then_reports_retry_after():
+    limiter = RateLimiter()
+    rule = RateLimit('test', 3, 60)
+    assert [limiter.hit(rule, 'a', T0 + i)[0] for i in range(3)] == [True] * 3
+    # The hits count fully until the window rolls over 50s later, then at
+    # the previous window's shrinking weight
+    assert limiter.hit(rule, 'a', T0 + 10) == (False, 50)
+    assert limiter.hit(rule, 'b', T0 + 10) == (True, 0)
+
+
+def test_previous_window_weight_slides_out():
+    limiter = RateLimiter()
+    rule = RateLimit('test', 4, 60)
+    for i in range(4):
+        limiter.hit(rule, 'a', T0 + 50 + i)
+    # At 15s into the next window the previous 4 hits weigh 4 * 45/60 = 3
+    assert limiter.hit(rule, 'a', T0 + 75) == (True, 0)
+    assert limiter.hit(rule, 'a', T0 + 76) == (True, 0)
+    # 4 * 43/60 + 2 is over the limit until 4 * (60 - t)/60 + 2 drops to 4 at t=30
+    assert limiter.hit(rule, 'a', T0 + 77) == (False, 13)
+    # Two windows later everything has expired
+    assert limiter.hit(rule, 'a', T0 + 180) == (True, 0)
+
+
+def test_lockout_blocks_until_it_expires():
+    limiter = RateLimiter()
+    rule = RateLimit('login', 2, 60, lockout=300)
+    limiter.hit(rule, 'a', T0)
+    limiter.hit(rule, 'a', T0 + 1)
+    assert limiter.hit(rule, 'a', T0 + 2) == (False, 300)
+    assert limiter.hit(rule, 'a', T0 + 200) == (False, 102)
+    assert limiter.hit(rule, 'a', T0 + 302) == (True, 0)
+
+
+def test_shared_rule_counts_all_clients():
+    limiter = RateLimiter()
+    rule = RateLimit('upstream', 2, 60, per_client=False)
+    assert limiter.hit(rule, 'a', T0)[0]
+    assert limiter.hit(rule, 'b', T0)[0]
+    assert not limiter.hit(rule, 'c', T0)[0]
+
+
+def test_hit_all_only_charges_when_every_rule_allows():
+    limiter = RateLimiter()
+    per_client = RateLimit('client', 1, 60)
+    shared = RateLimit('shared', 2, 60, per_client=False)
+    assert limiter.hit_all([per_client, shared], 'a', T0) == (None, 0)
+    rule, retry_after = limiter.hit_all([per_client, shared], 'a', T0 + 1)
+    assert rule is per_client and retry_after > 0
+    # The refused request did not use up the shared budget
+    assert limiter.hit_all([per_client, shared], 'b', T0 + 1) == (None, 0)
+    assert limiter.hit_all([per_client, shared], 'c', T0 + 1)[0] is shared
+
+
+def test_keys_are_capped_and_idle_ones_evicted():
+    limiter = RateLimiter(max_keys=3)
+    rule = RateLimit('test', 5, 60)
+    for client in 'abcde':
+        limiter.hit(rule, client, T0)
+    assert len(limiter) == 3
+
+    limiter = RateLimiter()
+    for client in 'abc':
+        limiter.hit(rule, client, T0)
+    # Keys idle for two windows are dropped as new ones arrive
+    limiter.hit(rule, 'd', T0 + 120)
+    limiter.hit(rule, 'e', T0 + 120)
+    assert len(limiter) == 2
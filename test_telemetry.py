@@ -0,0 +1,105 @@
+import numpy as np
+import pytest
+
+from telemetry import RingBuffer, TelemetryStore, parse_range
+
+
+def test_ring_buffer_wraps_in_time_order():
+    buffer = RingBuffer(3, 2)
+    for t in range(5):
+        buffer.append((t, t * 10))
+
+    assert buffer.size == 3
+    assert buffer.ordered()[:, 0].tolist() == [2, 3, 4]
+    assert buffer.last().tolist() == [4, 40]
+    assert buffer.since(3)[:, 0].tolist() == [3, 4]
+
+
+def test_ring_buffer_load_keeps_newest_rows():
+    buffer = RingBuffer(2, 2)
+    buffer.load(np.array([[1, 1], [2, 2], [3, 3]], dtype=float))
+    assert buffer.ordered()[:, 0].tolist() == [2, 3]
+
+
+def test_parse_range():
+    assert parse_range('90m') == 5400
+    assert parse_range('7d') == 7 * 86400
+    with pytest.raises(ValueError):
+        parse_range('soon')
+
+
+@pytest.mark.parametrize('range_, resolution', [
+    ('6h', 'raw'),
+    ('24h', '1m'),
+    ('7d', '1h'),
+    ('90d', '1h'),
+    ('1w', '1h'),
+    ('180d', '1d'),
+])
+def test_history_picks_tier_by_range(tmp_path, range_, resolution):
+    store = TelemetryStore(str(tmp_path))
+    assert store.history('Front', 'battery', parse_range(range_))[0] == resolution
+
+
+def test_history_downsamples_into_buckets(tmp_path):
+    store = TelemetryStore(str(tmp_path))
+    now = 1_700_000_000 - 1_700_000_000 % 3600
+    for minute in range(120):
+        store.record('Front', {'battery': minute % 4, 'note': 'skipped'}, now + minute * 60)
+    end = now + 120 * 60
+
+    resolution, points = store.history('Front', 'battery', 7 * 86400, now=end)
+    assert resolution == '1h'
+    assert [p['t'] for p in points] == [now, now + 3600]
+    assert points[0] == {'t': now, 'value': 1.5, 'min': 0, 'max': 3}
+
+    resolution, points = store.history('Front', 'battery', 3600, now=end)
+    assert resolution == 'raw'
+    assert len(points) == 60
+    assert store.history('Front', 'note', 3600, now=end)[1] == []
+
+
+def test_record_ignores_samples_that_are_not_newer(tmp_path):
+    store = TelemetryStore(str(tmp_path))
+    store.record('Front', {'temperature': 70}, 1000)
+    store.record('Front', {'temperature': 99}, 1000)
+    assert store.history('Front', 'temperature', 3600, now=1000)[1] == [{'t': 1000, 'value': 70}]
+
+
+def test_tiers_persist_across_restart(tmp_path):
+    store = TelemetryStore(str(tmp_path))
+    store.record('Front', {'armed': True}, 1000)
+    store.save()
+
+    restored = TelemetryStore(str(tmp_path))
+    resolution, points = restored.history('Front', 'armed', 2 * 86400, now=1000)
+    assert resolution == '1m'
+    assert points[0]['value'] == 1.0
+
+
+def test_short_range_falls_back_to_1m_after_restart(tmp_path):
+    store = TelemetryStore(str(tmp_path))
+    for minute in range(30):
+        store.record('Front', {'battery': 3}, 6000 + minute * 60)
+    store.save()
+
+    restored = TelemetryStore(str(tmp_path))
+    resolution, points = restored.history('Front', 'battery', 3600, now=6000 + 30 * 60)
+    assert resolution == '1m'
+    assert len(points) == 30
+
+    # Once new raw samples cover the whole range, raw answers again
+    resolution, _ = restored.history('Front', 'battery', 600, now=6000 + 30 * 60)
+    assert resolution == '1m'
+    for minute in range(30, 45):
+        restored.record('Front', {'battery': 2}, 6000 + minute * 60)
+    resolution, points = restored.history('Front', 'battery', 600, now=6000 + 45 * 60)
+    assert resolution == 'raw'
+    assert len(points) == 10
+
+
+def test_unreadable_files_are_logged(tmp_path):
+    (tmp_path / 'Front.npz').write_bytes(b'not numpy')
+    logged = []
+    TelemetryStore(str(tmp_path), log=logged.append).load()
+    assert len(logged) == 1 and 'Front.npz' in logged[0]
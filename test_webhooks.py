@@ -0,0 +1,102 @@
+import asyncio
+import datetime
+import json
+
+import webhooks
+from webhooks import LATE_EVENT_SECONDS, WebhookDispatcher
+
+NOW = 1_700_000_000
+
+
+def iso(ts):
+    return datetime.datetime.fromtimestamp(ts, datetime.timezone.utc).isoformat()
+
+
+def event(event_id, ts):
+    return {'id': event_id, 'camera': 'Front', 'timestamp': iso(ts)}
+
+
+def make_dispatcher(tmp_path, monkeypatch, now=NOW, **kwargs):
+    monkeypatch.setattr(webhooks.time, 'time', lambda: now)
+    dispatcher = WebhookDispatcher(['https://hook'], str(tmp_path / 'dead.jsonl'),
+                                   str(tmp_path / 'state.json'), log=lambda message: None, **kwargs)
+    dispatcher.published = []
+    dispatcher._publish = lambda event: dispatcher.published.append(event['id'])
+    return dispatcher
+
+
+def test_first_fetch_starts_from_now(tmp_path, monkeypatch):
+    dispatcher = make_dispatcher(tmp_path, monkeypatch)
+    dispatcher.publish_events([])
+    # A later sync reaching back 24h must not deliver the history
+    dispatcher.publish_events([event(i, NOW - i * 3600) for i in range(1, 20)] + [event(99, NOW + 30)])
+    assert dispatcher.published == [99]
+
+
+def test_refetched_events_are_delivered_once(tmp_path, monkeypatch):
+    dispatcher = make_dispatcher(tmp_path, monkeypatch)
+    dispatcher.publish_events([])
+    dispatcher.publish_events([event(1, NOW + 10), event(2, NOW + 20), {'camera': 'Front'}])
+    dispatcher.publish_events([event(1, NOW + 10), event(2, NOW + 20), event(3, NOW + 30)])
+    assert dispatcher.published == [1, 2, 3]
+
+
+def test_late_events_are_delivered_within_the_window(tmp_path, monkeypatch):
+    dispatcher = make_dispatcher(tmp_path, monkeypatch)
+    dispatcher.publish_events([])
+    dispatcher.publish_events([event(1, NOW + 2 * LATE_EVENT_SECONDS)])
+    # Listed after event 1 although it happened earlier
+    dispatcher.publish_events([event(2, NOW + LATE_EVENT_SECONDS + 60), event(3, NOW + 60)])
+    assert dispatcher.published == [1, 2]
+
+
+def test_state_survives_restart(tmp_path, monkeypatch):
+    dispatcher = make_dispatcher(tmp_path, monkeypatch)
+    dispatcher.publish_events([])
+    dispatcher.publish_events([event(1, NOW + 100), event(2, NOW + 200)])
+    assert json.loads((tmp_path / 'state.json').read_text())['published_until'] == NOW + 200
+
+    restored = make_dispatcher(tmp_path, monkeypatch, now=NOW + 3600)
+    restored.publish_events([event(1, NOW + 100), event(2, NOW + 200), event(3, NOW + 150)])
+    assert restored.published == [3]
+
+
+def test_batches_respect_size_and_concurrency(tmp_path, monkeypatch):
+    dispatcher = make_dispatcher(tmp_path, monkeypatch, batch_window=0.05, max_batch=3,
+                                 per_target_concurrency=1)
+    posted = []
+    gate = {}
+
+    class Response:
+        status = 200
+
+        async def __aenter__(self):
+            await gate['open'].wait()
+            return self
+
+        async def __aexit__(self, *exc):
+            return False
+
+    class Http:
+        def post(self, target, data, headers):
+            posted.append([event['id'] for event in json.loads(data)['events']])
+            return Response()
+
+    async def run():
+        gate['open'] = asyncio.Event()
+        dispatcher._loop = asyncio.get_running_loop()
+        dispatcher._queues = {'https://hook': asyncio.Queue(maxsize=5)}
+        for i in range(7):
+            dispatcher._enqueue({'id': i}, 0)
+        drain = asyncio.create_task(dispatcher._drain(Http(), 'https://hook'))
+        await asyncio.sleep(0.1)
+        # One batch is outstanding, so the queue is not read meanwhile
+        assert posted == [[0, 1, 2]]
+        gate['open'].set()
+        await asyncio.sleep(0.2)
+        drain.cancel()
+
+    asyncio.run(run())
+    assert posted == [[0, 1, 2], [3, 4]]
+    stats = dispatcher.stats()
+    assert (stats['published'], stats['dropped'], stats['events_delivered']) == (7, 2, 5)
@@ -0,0 +1,271 @@
+"""Batched delivery of new camera events to webhook targets"""
+import asyncio
+import datetime
+import json
+import os
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+
+from analytics import parse_timestamp
+
+# Event ids remembered so re-fetched events are only delivered once
+MAX_SEEN_EVENTS = 20000
+
+# Events can be listed after newer ones (clips upload at different speeds), so
+# events this much older than the newest published one are still delivered
+LATE_EVENT_SECONDS = 600
+
+# Recent delivery latencies kept for the stats endpoint
+LATENCY_SAMPLES = 1000
+
+
+class WebhookDispatcher:
+    """Queues events and POSTs them in batches to every configured target.
+
+    Each target has its own queue. Events are collected for up to
+    `batch_window` seconds (or `max_batch` events) and sent as one JSON body.
+    A target has at most `per_target_concurrency` batches outstanding,
+    retries included, and its queue is not read while they are; once the
+    queue holds `max_queue` events, new ones are dropped for that target.
+    Failed batches are retried with jittered exponential backoff and then
+    appended to `dead_letter_path`.
+
+    Every fetch is filtered against the newest published event time: events
+    older than it by more than LATE_EVENT_SECONDS are skipped, newer ones are
+    deduplicated by id. Both are saved to `state_path`, so events fetched
+    again after a restart are not re-sent. With no saved state, delivery
+    starts from the time of the first fetch.
+    """
+
+    def __init__(self, targets, dead_letter_path, state_path, batch_window=2.0, max_batch=100,
+                 max_queue=10000, per_target_concurrency=2, max_retries=5, log=print):
+        self.targets = list(targets)
+        self.dead_letter_path = dead_letter_path
+        self.state_path = state_path
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.max_queue = max_queue
+        self.per_target_concurrency = per_target_concurrency
+        self.max_retries = max_retries
+        self.log = log
+        self._loop = None
+        self._queues = {}
+        self._seen = OrderedDict()
+        self._since = None
+        self._published_until = None
+        self._load_state()
+        self._motion = {}
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=LATENCY_SAMPLES)
+        self._counters = {
+            'published': 0,
+            'dropped': 0,
+            'batches_sent': 0,
+            'events_delivered': 0,
+            'retries': 0,
+            'dead_lettered': 0,
+        }
+        self._started_at = time.time()
+
+    @property
+    def enabled(self):
+        return bool(self.targets)
+
+    def start(self):
+        """Start the delivery loop on a background thread"""
+        if self._loop is not None or not self.enabled:
+            return
+        self._loop = asyncio.new_event_loop()
+        self._queues = {target: asyncio.Queue(maxsize=self.max_queue) for target in self.targets}
+        threading.Thread(target=self._loop.run_until_complete, args=(self._main(),),
+                         name='webhooks', daemon=True).start()
+
+    # -- delivery state ------------------------------------------------------
+
+    def _load_state(self):
+        try:
+            with open(self.state_path) as f:
+                state = json.load(f)
+            published_until = state['published_until']
+            since = state.get('since', published_until)
+            recent = [(event_id, ts) for event_id, ts in state.get('recent', [])]
+        except FileNotFoundError:
+            return
+        except (ValueError, KeyError, TypeError) as e:
+            self.log(f'Webhook state unreadable, starting fresh: {e}')
+            return
+        self._since, self._published_until = since, published_until
+        self._seen.update(recent)
+
+    def _save_state(self):
+        cutoff = self._cutoff()
+        state = {
+            'since': self._since,
+            'published_until': self._published_until,
+            # Ids still inside the late-event window, so they are not re-sent
+            'recent': [[event_id, ts] for event_id, ts in self._seen.items()
+                       if ts is not None and ts > cutoff],
+        }
+        os.makedirs(os.path.dirname(self.state_path) or '.', exist_ok=True)
+        tmp_path = f'{self.state_path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.state_path)
+
+    def _cutoff(self):
+        """Events stamped at or before this time are never delivered"""
+        return max(self._since, self._published_until - LATE_EVENT_SECONDS)
+
+    # -- event sources -------------------------------------------------------
+
+    def publish_events(self, events):
+        """Publish fetched events that have not been delivered yet"""
+        if not self.enabled:
+            return
+        new_events = []
+        with self._lock:
+            seeding = self._published_until is None
+            if seeding:
+                self._since = self._published_until = time.time()
+            cutoff = self._cutoff()
+            for event in events:
+                event_id = event.get('id')
+                if event_id is None or event_id in self._seen:
+                    continue
+                ts = parse_timestamp(event.get('timestamp'))
+                if ts is not None and ts <= cutoff:
+                    continue
+                self._seen[event_id] = ts
+                if len(self._seen) > MAX_SEEN_EVENTS:
+                    self._seen.popitem(last=False)
+                if ts is not None:
+                    self._published_until = max(self._published_until, ts)
+                new_events.append(dict(event))
+            if seeding or new_events:
+                try:
+                    self._save_state()
+                except OSError as e:
+                    self.log(f'Could not save webhook state: {e}')
+        if seeding:
+            self.log('Webhooks: delivering events from now on')
+        for event in new_events:
+            self._publish(event)
+
+    def publish_snapshot(self, cameras):
+        """Publish a motion event for each camera whose motion_detected turned on"""
+        now = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        started = []
+        with self._lock:
+            for camera in cameras:
+                detected = bool(camera.get('motion_detected'))
+                if detected and self._motion.get(camera['name']) is False:
+                    started.append(camera['name'])
+                self._motion[camera['name']] = detected
+        for name in started:
+            self._publish({'type': 'motion_detected', 'camera': name, 'timestamp': now})
+
+    def _publish(self, event):
+        if self._loop is None:
+            return
+        self._loop.call_soon_threadsafe(self._enqueue, event, time.monotonic())
+
+    def _enqueue(self, event, published_at):
+        self._counters['published'] += 1
+        for queue in self._queues.values():
+            try:
+                queue.put_nowait((event, published_at))
+            except asyncio.QueueFull:
+                self._counters['dropped'] += 1
+
+    # -- delivery ------------------------------------------------------------
+
+    async def _main(self):
+        # Imported here so loading this module does not pull in aiohttp
+        from aiohttp import ClientSession, ClientTimeout
+        async with ClientSession(timeout=ClientTimeout(total=15)) as http:
+            await asyncio.gather(*(self._drain(http, target) for target in self.targets))
+
+    async def _drain(self, http, target):
+        """Batch one target's queue, reading it only while a send slot is free"""
+        queue = self._queues[target]
+        slots = asyncio.Semaphore(self.per_target_concurrency)
+        pending = set()
+        while True:
+            await slots.acquire()
+            batch = [await queue.get()]
+            deadline = self._loop.time() + self.batch_window
+            while len(batch) < self.max_batch:
+                remaining = deadline - self._loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            task = asyncio.create_task(self._deliver(http, target, batch))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+            task.add_done_callback(lambda _: slots.release())
+
+    async def _deliver(self, http, target, batch):
+        from aiohttp import ClientError
+        body = json.dumps({
+            'sent_at': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            'events': [event for event, _ in batch],
+        }, default=str)
+        error = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                self._counters['retries'] += 1
+                await asyncio.sleep(min(60, 2 ** attempt) * random.uniform(0.5, 1.5))
+            try:
+                async with http.post(target, data=body, headers={'Content-Type': 'application/json'}) as response:
+                    if response.status < 300:
+                        delivered = time.monotonic()
+                        self._counters['batches_sent'] += 1
+                        self._counters['events_delivered'] += len(batch)
+                        with self._lock:
+                            self._latencies.extend(delivered - published for _, published in batch)
+                        return
+                    error = f'HTTP {response.status}'
+                    if 400 <= response.status < 500 and response.status != 429:
+                        break
+            except (ClientError, asyncio.TimeoutError) as e:
+                error = str(e) or type(e).__name__
+        self._dead_letter(target, body, error)
+
+    def _dead_letter(self, target, body, error):
+        self._counters['dead_lettered'] += 1
+        self.log(f'Webhook delivery to {target} failed: {error}')
+        try:
+            os.makedirs(os.path.dirname(self.dead_letter_path) or '.', exist_ok=True)
+            with open(self.dead_letter_path, 'a') as f:
+                f.write(json.dumps({
+                    'target': target,
+                    'error': error,
+                    'failed_at': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                    'payload': json.loads(body),
+                }) + '\n')
+        except OSError as e:
+            self.log(f'Could not write webhook dead letter: {e}')
+
+    # -- observability -------------------------------------------------------
+
+    def stats(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+        uptime = max(time.time() - self._started_at, 1)
+        stats = dict(self._counters)
+        stats.update({
+            'targets': len(self.targets),
+            'queued': sum(queue.qsize() for queue in self._queues.values()),
+            'events_per_minute': round(stats['events_delivered'] * 60 / uptime, 2),
+            'latency_ms': {
+                'p50': round(latencies[len(latencies) // 2] * 1000, 1) if latencies else None,
+                'p95': round(latencies[int(len(latencies) * 0.95)] * 1000, 1) if latencies else None,
+                'max': round(latencies[-1] * 1000, 1) if latencies else None,
+            },
+        })
+        return stats